@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+
+"""
+Create release notes for many repositories and milestones in one process.
+
+The releases are listed in a manifest file (YAML or TOML).  All releases
+share one GitHub session (one pool of connections), one on-disk response
+cache, and one rate limit budget.  Several releases are fetched at once.
+One report is written for each release.
+
+.. autosummary::
+
+    ~main
+    ~batch_release_notes
+    ~read_manifest
+    ~Release
+"""
+
+import argparse
+import concurrent.futures
+import logging
+import pathlib
+import typing
+
+import yaml
+
+from . import create_release_notes as crn
+
+logger = logging.getLogger("batch_release_notes")
+
+PARALLEL = 4  # releases fetched at once
+
+
+class Release(typing.NamedTuple):
+    """One entry of the manifest."""
+
+    repository: tuple  # (organization, repository)
+    base: str
+    milestone: str
+    head: str = "master"
+    milestone_number: typing.Optional[int] = None
+    output: typing.Optional[str] = None
+    format: typing.Optional[str] = None
+
+    def output_file(self, directory):
+        """Report file, default: ORG_REPO_MILESTONE.md (or .json, .html)."""
+        if self.output is not None:
+            return pathlib.Path(directory) / self.output
+        fmt = crn.report_format(fmt=self.format)
+        suffix = {"markdown": "md"}.get(fmt, fmt)
+        stem = "_".join([*self.repository, self.milestone]).replace("/", "-")
+        return pathlib.Path(directory) / f"{stem}.{suffix}"
+
+
+def _load(path):
+    """Return the decoded content of a YAML or TOML file."""
+    path = pathlib.Path(path)
+    if path.suffix.lower() == ".toml":
+        try:
+            import tomllib  # Python 3.11+
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError(
+                    f"{path}: before Python 3.11, a TOML manifest"
+                    " needs the 'tomli' package (pip install tomli)"
+                ) from None
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def read_manifest(path):
+    """
+    Return the list of :class:`Release` entries in the manifest file.
+
+    The manifest has a ``releases`` list.  Each release has keys:
+    ``repository`` (``organization/repository``) or ``path`` (of a local
+    clone), ``base``, ``milestone``, and optionally: ``head``,
+    ``milestone_number``, ``output``, and ``format``.  Keys of the
+    optional ``defaults`` table apply to every release.  A relative
+    ``path`` is relative to the manifest file.  Values other than
+    ``milestone_number`` are text: quote a number such as ``"2.10"``
+    (unquoted, it would be read as ``2.1``).  Raise ``ValueError`` if a
+    release is not valid.
+
+    Example (YAML)::
+
+        defaults:
+          head: main
+        releases:
+          - repository: prjemian/murky
+            base: v0.0.5
+            milestone: v0.0.6
+          - path: ../hklpy
+            base: v1.0.0
+            milestone: "1.1"
+            format: html
+    """
+    path = pathlib.Path(path)
+    content = _load(path) or {}
+    defaults = content.get("defaults") or {}
+    releases = []
+    for i, entry in enumerate(content.get("releases") or [], start=1):
+        entry = {**defaults, **entry}
+        if "repository" in entry:
+            repository = tuple(str(entry.pop("repository")).split("/"))
+            entry.pop("path", None)
+        elif "path" in entry:
+            repository = crn.getRepositoryInfo(path.parent / entry.pop("path"))
+        else:
+            raise ValueError(f"{path}: release {i} has no 'repository' or 'path'")
+        missing = [k for k in ("base", "milestone") if k not in entry]
+        unknown = set(entry) - set(Release._fields)
+        if len(repository) != 2 or missing or unknown:
+            raise ValueError(
+                f"{path}: release {i}: repository={'/'.join(repository)!r}"
+                f" missing={missing} unknown={sorted(unknown)}"
+            )
+        for key, value in entry.items():
+            if key != "milestone_number" and not isinstance(value, str):
+                raise ValueError(
+                    f"{path}: release {i}: {key}={value!r} is not text, quote it"
+                )
+        if "milestone_number" in entry:
+            entry["milestone_number"] = int(entry["milestone_number"])
+        releases.append(Release(repository=repository, **entry))
+    return releases
+
+
+def _write_one(api, release, directory, jobs, incremental):
+    """Fetch one release and write its report, return the report file."""
+    output = release.output_file(directory)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    fmt = crn.report_format(output, release.format)
+    args = (None, release.base, release.head, release.milestone)
+    kwargs = dict(
+        api=api,
+        jobs=jobs,
+        milestone_number=release.milestone_number,
+        repository=release.repository,
+    )
+    with open(output, "w") as stream:
+        writer = crn.REPORT_WRITERS[fmt](stream)
+        if incremental:
+            info = crn.get_release_info_incremental(*args, **kwargs)
+            crn.report(release.milestone, *info, writer=writer)
+        else:
+            crn.write_release_notes(*args, writer=writer, **kwargs)
+    return output
+
+
+def batch_release_notes(
+    releases,
+    api,
+    directory=".",
+    parallel=PARALLEL,
+    jobs=crn.JOBS,
+    incremental=False,
+):
+    """
+    Write the report of each release, 'parallel' releases at once.
+
+    All releases use the same 'api' (a :class:`~murky.create_release_notes.GitHubAPI`)
+    so they share its session, cache, and rate limiter: the requests of
+    every release pause together when the rate limit is nearly used up.
+    Each release makes up to 'jobs' concurrent requests.
+
+    A release that fails is logged and does not stop the others.  Returns
+    {release: report file or exception}.
+    """
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = {}
+        for release in releases:
+            future = executor.submit(
+                _write_one, api, release, directory, jobs, incremental
+            )
+            futures[future] = release
+        for future in concurrent.futures.as_completed(futures):
+            release = futures[future]
+            name = "/".join(release.repository)
+            try:
+                results[release] = future.result()
+                logger.info("%s %s: %s", name, release.milestone, results[release])
+            except Exception as exinfo:
+                logger.error("%s %s: %s", name, release.milestone, exinfo)
+                results[release] = exinfo
+    return results
+
+
+def parse_command_line():
+    """Command line argument parser."""
+    doc = __doc__.strip().splitlines()[0]
+    parser = argparse.ArgumentParser(description=doc)
+
+    parser.add_argument(
+        "manifest", action="store", help="YAML or TOML file listing the releases"
+    )
+
+    parser.add_argument(
+        "token",
+        action="store",
+        help=("personal access token " "(see: https://github.com/settings/tokens)"),
+    )
+
+    parser.add_argument(
+        "-d",
+        "--directory",
+        action="store",
+        default=".",
+        help="write the reports in this directory (default: current directory)",
+    )
+
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        action="store",
+        type=int,
+        default=PARALLEL,
+        help=f"number of releases fetched at once (default={PARALLEL})",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        default=crn.JOBS,
+        help=f"concurrent GitHub requests for each release (default={crn.JOBS})",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="do not read or write the on-disk cache of GitHub responses",
+    )
+
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        default=False,
+        help="revalidate every cached GitHub response",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="fetch only what changed since the previous run of each release",
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    """Command-line application program."""
+    logger.setLevel(logging.INFO)
+    cmd = parse_command_line()
+    parallel, jobs = max(1, cmd.parallel), max(1, cmd.jobs)
+
+    releases = read_manifest(cmd.manifest)
+    cache = None if cmd.no_cache else crn.ResponseCache(refresh=cmd.refresh)
+    api = crn.GitHubAPI(cmd.token, cache=cache, pool_size=parallel * jobs)
+    results = batch_release_notes(
+        releases,
+        api,
+        directory=cmd.directory,
+        parallel=parallel,
+        jobs=jobs,
+        incremental=cmd.incremental,
+    )
+    failed = [r for r, result in results.items() if isinstance(result, Exception)]
+    if failed:
+        raise SystemExit(f"{len(failed)} of {len(releases)} releases failed.")
+
+
+if __name__ == "__main__":
+    main()
+
+
+# -----------------------------------------------------------------------------
+# :author:    Pete R. Jemian
+# :email:     prjemian@gmail.com
+# :copyright: (c) 2014-2024, Pete R. Jemian
+#
+# Distributed under the terms of the Creative Commons Attribution 4.0 International Public License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
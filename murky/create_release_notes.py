@@ -11,14 +11,35 @@ Run from the root directory of a package.
     ~findGitConfigFile
     ~getRepositoryInfo
     ~get_release_info
+    ~get_release_info_incremental
+    ~fetch_local_commits
+    ~fetch_local_tags
     ~parse_command_line
     ~report
+    ~write_release_notes
+    ~ReportWriter
+    ~MarkdownWriter
+    ~JSONWriter
+    ~HTMLWriter
+    ~Repository
+    ~Milestone
+    ~TagRecord
+    ~PullRecord
+    ~IssueRecord
+    ~CommitRecord
+    ~GitHubAPI
+    ~GitHubAPIError
+    ~Cassette
+    ~MilestoneIndex
+    ~Profiler
+    ~RateLimiter
+    ~ResponseCache
 """
 
 # Requires:
 #
 # * assumes current directory is within a repository clone
-# * pyGithub (conda or pip install) - https://pygithub.readthedocs.io/
+# * requests (conda or pip install) - https://requests.readthedocs.io/
 # * Github personal access token (https://github.com/settings/tokens)
 #
 # Github token access is needed or the GitHub API limit
@@ -26,17 +47,50 @@ Run from the root directory of a package.
 # of the release.
 
 import argparse
+import concurrent.futures
 import configparser
+import contextlib
+import copy
 import datetime
+import functools
+import gzip
+import hashlib
+import html
+import json
 import logging
+import os
 import pathlib
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import typing
 import urllib
 
-import github
+import requests
+
+from . import local_git
 
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger("create_release_notes")
 
+GITHUB_API_URL = "https://api.github.com"
+PAGE_SIZE = 100  # largest page size allowed by the GitHub API
+TIMEOUT_S = 30
+JOBS = 1  # concurrent requests
+RATE_LIMIT_RESERVE = 10  # pause when this few requests remain
+RATE_LIMIT_RETRIES = 5  # attempts after a request is rejected by a rate limit
+
+CACHE_DIR = pathlib.Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser()
+CACHE_FILE = CACHE_DIR / "murky" / "github_responses.sqlite"
+CACHE_TTL_S = 10 * 60  # serve without asking GitHub when younger than this
+CACHE_MAX_AGE_S = 30 * 24 * 3600  # evict when not used for this long
+CACHE_MAX_BYTES = 256 * 2**20  # evict least-recently used beyond this size
+SNAPSHOT_DIR = CACHE_DIR / "murky" / "snapshots"
+MILESTONE_INDEX_FILE = CACHE_DIR / "murky" / "milestones.json"
+SNAPSHOT_SKEW = datetime.timedelta(minutes=5)
+
 
 def findGitConfigFile(path=None):
     """
@@ -85,57 +139,1408 @@ def getRepositoryInfo(path=None):
     raise ValueError(f"No GitHub info found: {path!r}")
 
 
-def get_release_info(token, base_tag_name, head_branch_name, milestone_name):
-    """Mine the Github API for information about this release."""
-    organization_name, repository_name = getRepositoryInfo()
-    gh = github.Github(token)  # GitHub Personal Access Token
+class GitHubAPIError(RuntimeError):
+    """The GitHub API reported an error."""
 
-    user = gh.get_user(organization_name)
-    logger.debug(f"user: {user}")
 
-    repo = user.get_repo(repository_name)
-    logger.debug(f"repo: {repo}")
+class CachedResponse:
+    """A response replayed from the :class:`ResponseCache` or a :class:`Cassette`."""
+
+    def __init__(self, body, headers, links, status_code=200):
+        self.content = body
+        self.headers = headers
+        self.links = links
+        self.status_code = status_code
+
+    @property
+    def text(self):
+        return self.content.decode("utf8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """
+    GitHub API responses, persisted in an SQLite database.
+
+    Entries are keyed by method, URL, query parameters, request body and
+    (a hash of) the token, so clients with other access do not share them.
+    An entry younger than ``ttl`` seconds is used without asking GitHub.
+    Older REST entries are revalidated with a conditional request
+    (``If-None-Match`` / ``If-Modified-Since``); a ``304 Not Modified``
+    reply does not count against the rate limit.  GraphQL replies carry no
+    validators (no ``ETag`` or ``Last-Modified``): older GraphQL entries
+    are fetched again.
+
+    PARAMETERS
+
+    path : *str* or *pathlib.Path*
+        SQLite database file.  Default: ``CACHE_FILE``
+    ttl : *float*
+        Seconds an entry is served without revalidation.
+    max_age : *float*
+        Entries not used for this many seconds are evicted.
+    max_bytes : *int*
+        Least-recently used entries are evicted beyond this total size.
+    refresh : *bool*
+        Revalidate (or fetch again) every entry, regardless of ``ttl``.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        ttl=CACHE_TTL_S,
+        max_age=CACHE_MAX_AGE_S,
+        max_bytes=CACHE_MAX_BYTES,
+        refresh=False,
+    ):
+        self.path = pathlib.Path(path or CACHE_FILE)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()  # one connection, shared by threads
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " headers TEXT,"
+            " links TEXT,"
+            " body BLOB,"
+            " stored REAL,"
+            " accessed REAL,"
+            " size INTEGER)"
+        )
+        self.db.commit()
+        self.evict()
+
+    @staticmethod
+    def key(method, url, params=None, body=None, token=None):
+        """Return the cache key of a request (made with 'token')."""
+        if token:
+            token = hashlib.sha256(token.encode("utf8")).hexdigest()
+        text = json.dumps([method, url, params, body, token], sort_keys=True)
+        return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+    def get(self, key):
+        """Return (response, is_fresh, validators) or None if not cached."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT etag, last_modified, headers, links, body, stored"
+                " FROM responses WHERE key=?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, headers, links, body, stored = row
+        response = CachedResponse(body, json.loads(headers), json.loads(links))
+        is_fresh = not self.refresh and (time.time() - stored) < self.ttl
+        validators = {}
+        if etag:
+            validators["If-None-Match"] = etag
+        if last_modified:
+            validators["If-Modified-Since"] = last_modified
+        return response, is_fresh, validators
+
+    def put(self, key, response):
+        """Save a successful response."""
+        now = time.time()
+        headers = {
+            k: response.headers[k]
+            for k in ("ETag", "Last-Modified", "Link")
+            if k in response.headers
+        }
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    json.dumps(headers),
+                    json.dumps(response.links),
+                    response.content,
+                    now,
+                    now,
+                    len(response.content),
+                ),
+            )
+            self.db.commit()
+
+    def touch(self, key):
+        """Mark an entry as revalidated (and used) now."""
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "UPDATE responses SET stored=?, accessed=? WHERE key=?",
+                (now, now, key),
+            )
+            self.db.commit()
+
+    def evict(self):
+        """Remove entries by age, then least-recently used ones by size."""
+        self.db.execute(
+            "DELETE FROM responses WHERE accessed < ?", (time.time() - self.max_age,)
+        )
+        (total,) = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total > self.max_bytes:
+            rows = self.db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed"
+            ).fetchall()
+            stale = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+            self.db.executemany("DELETE FROM responses WHERE key=?", stale)
+        self.db.commit()
+
+
+class Cassette:
+    """
+    Record GitHub responses to a file, or replay them without a network.
+
+    A stand-in for the HTTP session of :class:`GitHubAPI`.  Given a
+    'session', requests are sent with it and each response is recorded;
+    :meth:`save` writes them to 'path' (JSON, gzip-compressed when the
+    name ends with ``.gz``).  Without a 'session', responses are replayed
+    from 'path' and a request that was not recorded raises
+    :class:`GitHubAPIError`.  Requests are matched by method, URL, query
+    parameters and body (not by token, so a cassette replays with any).
+    """
+
+    def __init__(self, path=None, session=None):
+        self.path = None if path is None else pathlib.Path(path)
+        self.session = session
+        self.headers = {} if session is None else session.headers
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.interactions = {}
+        if session is None and self.path is not None:
+            opener = gzip.open if self.path.suffix == ".gz" else open
+            with opener(self.path, "rt", encoding="utf8") as f:
+                self.interactions = json.load(f)
+
+    def request(self, method, url, params=None, json=None, headers=None, **kwargs):
+        """Send (or replay) one request, like ``requests.Session.request()``."""
+        key = ResponseCache.key(method, url, params, json)
+        with self.lock:
+            self.requests += 1
+        if self.session is None:
+            recorded = self.interactions.get(key)
+            if recorded is None:
+                raise GitHubAPIError(f"{method} {url}: not in cassette {self.path}")
+            return CachedResponse(
+                recorded["content"].encode("utf8"),
+                recorded["headers"],
+                recorded["links"],
+                status_code=recorded["status"],
+            )
+
+        response = self.session.request(
+            method, url, params=params, json=json, headers=headers, **kwargs
+        )
+        if response.status_code != 304:  # Replays are never conditional.
+            with self.lock:
+                self.interactions[key] = dict(
+                    status=response.status_code,
+                    headers=dict(response.headers),
+                    links=response.links,
+                    content=response.text,
+                )
+        return response
+
+    def save(self, path=None):
+        """Write the recorded responses."""
+        path = pathlib.Path(path or self.path)
+        opener = gzip.open if path.suffix == ".gz" else open
+        with self.lock, opener(path, "wt", encoding="utf8") as f:
+            json.dump(self.interactions, f)
+
+
+class RateLimiter:
+    """
+    Pace requests by the rate limit GitHub reports with every response.
+
+    When the remaining budget falls to ``reserve``, all requests wait until
+    the limit resets.  A rejected request (primary or secondary rate limit)
+    waits for ``Retry-After`` (or the reset time, or an exponential
+    back-off) and is then retried.  One instance may be shared by many
+    threads and many :class:`GitHubAPI` clients.
+    """
+
+    def __init__(self, reserve=RATE_LIMIT_RESERVE, sleep=time.sleep):
+        self.reserve = reserve
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.not_before = 0  # time.time() when requests may resume
+
+    def wait(self):
+        """Block until requests may be sent."""
+        with self.lock:
+            delay = self.not_before - time.time()
+        if delay > 0:
+            logger.warning("Rate limit: waiting %.0f s", delay)
+            self.sleep(delay)
+
+    def update(self, response, attempt=0):
+        """Record the rate limit state, return True to retry the request."""
+        headers = response.headers
+        now = time.time()
+        with self.lock:
+            if "X-RateLimit-Remaining" in headers:
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+                reset = float(headers.get("X-RateLimit-Reset", now))
+                if self.remaining <= self.reserve:
+                    self.not_before = max(self.not_before, reset + 1)
+
+            rejected = response.status_code == 429 or (
+                response.status_code == 403
+                and (
+                    "Retry-After" in headers
+                    or self.remaining == 0
+                    or "rate limit" in response.text.lower()
+                )
+            )
+            if not rejected or attempt >= RATE_LIMIT_RETRIES:
+                return False
+            if "Retry-After" in headers:
+                resume = now + float(headers["Retry-After"])
+            elif self.remaining == 0:
+                resume = self.not_before
+            else:
+                resume = now + 2**attempt * 5  # secondary limit, no advice
+            self.not_before = max(self.not_before, resume)
+            return True
+
+
+class Profiler:
+    """
+    Count and time the GitHub requests of each phase of a run.
+
+    A phase (such as ``"pulls"``) is entered with :meth:`phase` in the
+    thread that makes its requests.  For each phase, :meth:`summary`
+    reports the number of requests (from the network, the cache, or
+    revalidated with ``304 Not Modified``), bytes received, a histogram
+    of request latency, and the time spent.  The rate limit budget
+    (by resource, such as ``core`` or ``graphql``) is taken from the
+    response headers.  :meth:`trace_events` describes every phase and
+    request in the Trace Event Format (for ``chrome://tracing`` or
+    https://ui.perfetto.dev).  One instance may be shared by many threads.
+    """
+
+    BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.rate_limits = {}
+        self.events = []
+
+    def current(self):
+        """Name of the phase of this thread."""
+        return getattr(self.local, "phase", None) or "other"
+
+    def _phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = dict(
+                requests=0,
+                network=0,
+                cache=0,
+                not_modified=0,
+                bytes=0,
+                seconds=0.0,
+                latency_ms=[],
+            )
+        return phase
+
+    def _event(self, name, category, start, end, **args):
+        self.events.append(
+            dict(
+                name=name,
+                cat=category,
+                ph="X",
+                ts=round((start - self.start) * 1e6),
+                dur=round((end - start) * 1e6),
+                pid=os.getpid(),
+                tid=threading.get_ident(),
+                args=args,
+            )
+        )
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context: the requests of this thread are part of phase 'name'."""
+        previous = getattr(self.local, "phase", None)
+        if previous == name:  # nested, already counted
+            yield
+            return
+        self.local.phase = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.local.phase = previous
+            with self.lock:
+                self._phase(name)["seconds"] += end - start
+                self._event(name, "phase", start, end)
+
+    def record(self, method, url, response, source, start):
+        """Record one request (and its response) of the current phase."""
+        end = time.perf_counter()
+        size = len(response.content or b"") if source == "network" else 0
+        headers = response.headers
+        with self.lock:
+            phase = self._phase(self.current())
+            phase["requests"] += 1
+            phase[{"304": "not_modified"}.get(source, source)] += 1
+            phase["bytes"] += size
+            phase["latency_ms"].append((end - start) * 1000)
+            # Budget consumed since the first response (of each resource).
+            if source != "cache" and "X-RateLimit-Remaining" in headers:
+                resource = headers.get("X-RateLimit-Resource", "core")
+                remaining = int(headers["X-RateLimit-Remaining"])
+                budget = self.rate_limits.setdefault(
+                    resource,
+                    dict(
+                        limit=int(headers.get("X-RateLimit-Limit", 0)),
+                        first=remaining,
+                        last=remaining,
+                    ),
+                )
+                budget["last"] = remaining
+            self._event(
+                f"{method} {url.split('?')[0]}",
+                "request",
+                start,
+                end,
+                phase=self.current(),
+                source=source,
+                status=response.status_code,
+                bytes=size,
+            )
+
+    def histogram(self, latencies):
+        """Return {bucket: count} of latencies (ms); key ">N" is the overflow."""
+        counts = {f"<={b}": 0 for b in self.BUCKETS_MS}
+        counts[f">{self.BUCKETS_MS[-1]}"] = 0
+        for latency in latencies:
+            bucket = next((b for b in self.BUCKETS_MS if latency <= b), None)
+            counts[f">{self.BUCKETS_MS[-1]}" if bucket is None else f"<={bucket}"] += 1
+        return counts
+
+    def summary(self):
+        """Return the profile: totals by phase, and the rate limit budget."""
+        with self.lock:
+            phases = {}
+            for name, phase in self.phases.items():
+                latencies = sorted(phase["latency_ms"])
+                result = {k: v for k, v in phase.items() if k != "latency_ms"}
+                if latencies:
+                    result["latency_ms"] = dict(
+                        median=latencies[len(latencies) // 2],
+                        p90=latencies[int(len(latencies) * 0.9)],
+                        max=latencies[-1],
+                        histogram=self.histogram(latencies),
+                    )
+                phases[name] = result
+            rate_limit = {
+                resource: dict(
+                    limit=budget["limit"],
+                    remaining=budget["last"],
+                    consumed=budget["first"] - budget["last"],
+                )
+                for resource, budget in self.rate_limits.items()
+            }
+        return dict(
+            seconds=time.perf_counter() - self.start,
+            phases=phases,
+            rate_limit=rate_limit,
+        )
+
+    def trace_events(self):
+        """Return the phases and requests in the Trace Event Format."""
+        with self.lock:
+            return dict(traceEvents=list(self.events), displayTimeUnit="ms")
+
+    def write(self, path):
+        """
+        Write the profile to 'path': JSON, or a text summary.
+
+        A JSON file has the :meth:`summary` and the :meth:`trace_events`.
+        Path ``"-"`` writes the text summary on ``stderr``.
+        """
+        if str(path).endswith(".json"):
+            with open(path, "w") as f:
+                json.dump(dict(self.trace_events(), summary=self.summary()), f)
+            return
+
+        summary = self.summary()
+        lines = [
+            f"{'phase':<24} {'requests':>8} {'network':>8} {'cache':>6}"
+            f" {'304':>5} {'KiB':>9} {'seconds':>8} {'median ms':>9} {'p90 ms':>8}"
+        ]
+        for name, phase in sorted(summary["phases"].items()):
+            latency = phase.get("latency_ms", {})
+            lines.append(
+                f"{name:<24} {phase['requests']:>8} {phase['network']:>8}"
+                f" {phase['cache']:>6} {phase['not_modified']:>5}"
+                f" {phase['bytes'] / 1024:>9.1f} {phase['seconds']:>8.3f}"
+                f" {latency.get('median', 0):>9.1f} {latency.get('p90', 0):>8.1f}"
+            )
+        for resource, budget in sorted(summary["rate_limit"].items()):
+            lines.append(
+                f"rate limit {resource}: {budget['consumed']} consumed,"
+                f" {budget['remaining']} of {budget['limit']} remaining"
+            )
+        lines.append(f"total: {summary['seconds']:.3f} s")
+        stream = sys.stderr if str(path) == "-" else open(path, "w")
+        try:
+            stream.write("\n".join(lines) + "\n")
+        finally:
+            if stream is not sys.stderr:
+                stream.close()
+
+
+class GitHubAPI:
+    """
+    Minimal client for the GitHub REST and GraphQL APIs.
+
+    All traffic goes through :meth:`request`, one pooled HTTP session.
+    GET requests and GraphQL queries are saved in the (optional)
+    :class:`ResponseCache`.  A client from :meth:`revalidating` does not
+    serve fresh cache entries without asking GitHub.
+    """
+
+    def __init__(
+        self,
+        token,
+        base_url=GITHUB_API_URL,
+        session=None,
+        cache=None,
+        limiter=None,
+        pool_size=JOBS,
+        profiler=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.limiter = limiter or RateLimiter()
+        self.profiler = profiler
+        self.token = token
+        self.revalidate = False
+        self.session = session or self.new_session(pool_size)
+        self.session.headers.update(
+            {
+                "Accept": "application/vnd.github+json",
+                "User-Agent": "murky-create_release_notes",
+            }
+        )
+        if token:
+            self.session.headers["Authorization"] = f"bearer {token}"
+
+    @staticmethod
+    def new_session(pool_size=JOBS):
+        """Return a requests session, pooling enough connections for the jobs."""
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(pool_size, 10))
+        session.mount("https://", adapter)
+        return session
+
+    def revalidating(self):
+        """
+        Return a client sharing this one's session, cache and limiter that
+        never serves a cached response without asking GitHub.
+
+        A response may still be replayed after ``304 Not Modified``.
+        """
+        api = copy.copy(self)
+        api.revalidate = True
+        return api
+
+    def profile(self, phase):
+        """Context: count the requests (in this thread) as part of 'phase'."""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(phase)
+
+    def request(self, method, url, **kwargs):
+        """Send one HTTP request, raise GitHubAPIError if it fails."""
+        if not url.startswith("http"):
+            url = f"{self.base_url}/{url.lstrip('/')}"
+        start = time.perf_counter()
+        response, source = self._send(method, url, **kwargs)
+        if self.profiler is not None:
+            self.profiler.record(method, url, response, source, start)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        """Return (response, source): from the "cache", "network", or "304"."""
+        key = cached = None
+        headers = {}
+        if self.cache is not None and method in ("GET", "POST"):
+            key = self.cache.key(
+                method, url, kwargs.get("params"), kwargs.get("json"), self.token
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                response, is_fresh, validators = cached
+                if is_fresh and not self.revalidate:
+                    logger.debug("cache hit: %s %s", method, url)
+                    return response, "cache"
+                headers.update(validators)
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.limiter.wait()
+            response = self.session.request(
+                method, url, timeout=TIMEOUT_S, headers=headers, **kwargs
+            )
+            if not self.limiter.update(response, attempt):
+                break
+        if response.status_code == 304 and cached is not None:
+            logger.debug("not modified: %s %s", method, url)
+            self.cache.touch(key)
+            return cached[0], "304"
+        if response.status_code >= 400:
+            raise GitHubAPIError(
+                f"{method} {url}: HTTP {response.status_code} {response.text[:200]}"
+            )
+        if key is not None and not (method == "POST" and "errors" in response.json()):
+            self.cache.put(key, response)
+        return response, "network"
+
+    def get(self, path, params=None):
+        """Return the decoded JSON body of a REST GET request."""
+        return self.request("GET", path, params=params).json()
+
+    def graphql(self, query, variables=None):
+        """Return the 'data' of a GraphQL query."""
+        body = {"query": query, "variables": variables or {}}
+        result = self.request("POST", "graphql", json=body).json()
+        if result.get("errors"):
+            raise GitHubAPIError(f"GraphQL: {result['errors']}")
+        return result["data"]
+
+    def graphql_nodes(self, query, variables, path):
+        """
+        Yield the nodes of a paginated GraphQL connection.
+
+        ``path`` is the sequence of keys from ``data`` to the connection.
+        The query must accept a ``$cursor`` variable.
+        """
+        variables = dict(variables, cursor=None)
+        while True:
+            connection = self.graphql(query, variables)
+            for key in path:
+                connection = connection[key]
+            yield from connection["nodes"]
+            page_info = connection["pageInfo"]
+            if not page_info["hasNextPage"]:
+                break
+            variables["cursor"] = page_info["endCursor"]
+
+
+REPOSITORY_QUERY = """
+query($owner: String!, $name: String!, $number: Int!) {
+  repository(owner: $owner, name: $name) {
+    url
+    homepageUrl
+    latestRelease { url }
+    milestone(number: $number) { number title url }
+  }
+}
+"""
+
+MILESTONES_QUERY = """
+query($owner: String!, $name: String!, $title: String, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    url
+    homepageUrl
+    latestRelease { url }
+    milestones(first: 100, after: $cursor, states: [OPEN, CLOSED], query: $title) {
+      pageInfo { hasNextPage endCursor }
+      nodes { number title url }
+    }
+  }
+}
+"""
+
+TAGS_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    refs(refPrefix: "refs/tags/", first: 100, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        target {
+          ...commitFields
+          ... on Tag { target { ...commitFields } }
+        }
+      }
+    }
+  }
+}
+fragment commitFields on Commit { oid committedDate url }
+"""
+
+PULLS_QUERY = """
+query(
+  $owner: String!
+  $name: String!
+  $cursor: String
+  $states: [PullRequestState!]
+) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(
+      states: $states
+      first: 100
+      after: $cursor
+      orderBy: { field: UPDATED_AT, direction: DESC }
+    ) {
+      pageInfo { hasNextPage endCursor }
+      nodes { number title url closedAt updatedAt merged }
+    }
+  }
+}
+"""
+
+MILESTONE_ISSUES_QUERY = """
+query(
+  $owner: String!
+  $name: String!
+  $number: Int!
+  $cursor: String
+  $states: [IssueState!]
+  $since: DateTime
+) {
+  repository(owner: $owner, name: $name) {
+    milestone(number: $number) {
+      issues(
+        states: $states
+        filterBy: { since: $since }
+        first: 100
+        after: $cursor
+      ) {
+        pageInfo { hasNextPage endCursor }
+        nodes { number title url closedAt labels(first: 20) { nodes { name } } }
+      }
+    }
+  }
+}
+"""
+
+
+class Repository(typing.NamedTuple):
+    """The repository, as reported."""
+
+    url: str
+    homepage: str
+    release_url: str  # latest release
+
+
+class Milestone(typing.NamedTuple):
+    """A milestone, as reported."""
+
+    number: int
+    title: str
+    url: str
+
+
+class TagRecord(typing.NamedTuple):
+    """A tag, peeled to its commit, as reported."""
+
+    name: str
+    sha: str  # commit
+    date: datetime.datetime  # of the commit
+    url: str
+    commit_url: str
+
+
+class PullRecord(typing.NamedTuple):
+    """A closed pull request, as reported."""
+
+    number: int
+    title: str
+    url: str
+    closed_at: datetime.datetime  # None if (re)opened
+    merged: bool
+
+
+class IssueRecord(typing.NamedTuple):
+    """An issue, as reported."""
+
+    number: int
+    title: str
+    url: str
+    closed_at: datetime.datetime  # None if (re)opened
+    labels: tuple
+
+
+class CommitRecord(typing.NamedTuple):
+    """A commit, as reported."""
+
+    sha: str
+    date: str  # ISO8601, UTC
+    subject: str  # first line of the message
+    url: str
+
+
+def _profiled(phase):
+    """Decorator: requests of 'function(api, ...)' are part of 'phase'."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(api, *args, **kwargs):
+            with api.profile(phase):
+                return function(api, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def subject(message):
+    """Return the first line of a commit message."""
+    return (message.splitlines() or [""])[0]
+
+
+def parse_timestamp(text):
+    """Convert a GitHub ISO8601 timestamp ('...Z') to an aware datetime."""
+    return datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+
+
+def fetch_local_commits(owner, name, base, head, path=None):
+    """
+    Return (commits, base_date, status) for the range, from the local clone.
+
+    Same as :func:`fetch_commits` but read by ``git log`` in directory
+    'path': no API requests and no limit on the number of commits.
+    """
+    shas = {}
+    for ref in (base, head):
+        shas[ref] = local_git.resolve_commit(ref, cwd=path)
+        if shas[ref] is None:
+            raise ValueError(
+                f"Not found in the local clone: {ref!r}  (try: git fetch --tags)"
+            )
+    base_sha, head_sha = shas[base], shas[head]
 
+    url = f"https://github.com/{owner}/{name}/commit"
+    commits = {
+        sha: CommitRecord(sha, date, subject(message), f"{url}/{sha}")
+        for sha, date, message in local_git.iter_commits(base_sha, head_sha, path)
+    }
+    base_date = parse_timestamp(local_git.commit_date(base_sha, cwd=path))
+    if base_sha == head_sha:
+        status = "identical"
+    elif local_git.is_ancestor(base_sha, head_sha, cwd=path):
+        status = "ahead"
+    else:
+        status = "diverged"
+    return commits, base_date, status
+
+
+def fetch_local_tags(owner, name, path=None):
+    """
+    Return dictionary of all tags, like :func:`fetch_tags`, from the local clone.
+
+    No API requests are made.  Index is built from the ``.git`` directory
+    in (or above) 'path'.
+    """
+    url = f"https://github.com/{owner}/{name}"
+    return {
+        tag["name"]: TagRecord(
+            name=tag["name"],
+            sha=tag["sha"],
+            date=parse_timestamp(tag["date"]),
+            url=f"{url}/releases/tag/{tag['name']}",
+            commit_url=f"{url}/commit/{tag['sha']}",
+        )
+        for tag in local_git.tag_index(cwd=path).values()
+    }
+
+
+@_profiled("tags")
+def _fetch_tags(api, owner, local):
+    """Return all tags from the local clone or (if shallow) the API."""
+    if local:
+        if not local_git.is_shallow():
+            return fetch_local_tags(**owner)
+        logger.warning("Shallow clone: requesting the tags from GitHub.")
+    return fetch_tags(api, **owner)
+
+
+def repo_url(commit_url):
+    """Return the repository web page from the web page of a commit."""
+    return commit_url.rsplit("/commit/", 1)[0]
+
+
+class MilestoneIndex:
+    """
+    Milestone numbers by title, for each repository, saved between runs.
+
+    Many threads may update the index at once, each with its own instance:
+    an update merges into the file as it is then and replaces it
+    atomically.  A file that cannot be read is treated as empty.
+
+    PARAMETERS
+
+    path : *str* or *pathlib.Path*
+        JSON file.  Default: ``MILESTONE_INDEX_FILE``
+    """
+
+    lock = threading.Lock()  # shared by all instances (and so all writers)
+
+    def __init__(self, path=None):
+        self.path = pathlib.Path(path or MILESTONE_INDEX_FILE)
+        self.index = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path) as fp:
+                index = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring milestone index %s: %s", self.path, exc)
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def get(self, owner, name, title):
+        """Return the number of the milestone, None if not known."""
+        return self.index.get(f"{owner}/{name}", {}).get(title)
+
+    def update(self, owner, name, numbers):
+        """Add {title: number} of milestones and save the index."""
+        with self.lock:
+            self.index = self._read()
+            self.index.setdefault(f"{owner}/{name}", {}).update(numbers)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(
+                prefix=f".{self.path.name}.", suffix=".tmp", dir=self.path.parent
+            )
+            try:
+                with os.fdopen(fd, "w") as fp:
+                    json.dump(self.index, fp, indent=2)
+                os.replace(tmp, self.path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp)
+                raise
+
+
+def _repository(data):
+    return Repository(
+        url=data["url"],
+        homepage=data["homepageUrl"],
+        release_url=(data["latestRelease"] or {}).get("url"),
+    )
+
+
+@_profiled("repository")
+def fetch_repository(api, owner, name, milestone_name, milestone_number=None):
+    """
+    Return (repo, milestone) records, usually from a single query.
+
+    The milestone is requested by number: 'milestone_number' if given,
+    otherwise the number saved in the :class:`MilestoneIndex`.  When the
+    number is not known (or names another milestone now), milestones
+    matching the title are listed and the index is refreshed.
+    """
+    index = MilestoneIndex()
+    number = milestone_number or index.get(owner, name, milestone_name)
+    if number is not None:
+        data = api.graphql(
+            REPOSITORY_QUERY, dict(owner=owner, name=name, number=number)
+        )
+        data = data["repository"]
+        m = data["milestone"]
+        if m is not None and (milestone_number or m["title"] == milestone_name):
+            if m["title"] != milestone_name:
+                logger.warning(
+                    "Milestone %d is %r, not %r", number, m["title"], milestone_name
+                )
+            return _repository(data), Milestone(**m)
+        logger.debug("milestone index is stale: %r", milestone_name)
+
+    variables = dict(owner=owner, name=name, title=milestone_name, cursor=None)
+    repo = None
     milestone = None
-    for m in repo.get_milestones(state="all"):
-        if m.title == milestone_name:
-            milestone = m
+    numbers = {}
+    while milestone is None:
+        data = api.graphql(MILESTONES_QUERY, variables)["repository"]
+        repo = repo or _repository(data)
+        for m in data["milestones"]["nodes"]:
+            numbers[m["title"]] = m["number"]
+            if m["title"] == milestone_name:
+                milestone = Milestone(**m)
+        page_info = data["milestones"]["pageInfo"]
+        if not page_info["hasNextPage"]:
+            break
+        variables["cursor"] = page_info["endCursor"]
+    if numbers:
+        index.update(owner, name, numbers)
+    return repo, milestone
+
+
+@_profiled("commits")
+def fetch_commits(api, owner, name, base, head, executor=None):
+    """
+    Return (commits, base_date, status) for the ``base...head`` range.
+
+    'status' tells how 'head' relates to 'base' ("ahead", "identical",
+    "behind", or "diverged").
+
+    The first page reports the total number of commits.  With an
+    'executor', the remaining pages are then requested concurrently.
+    """
+    path = f"repos/{owner}/{name}/compare/{base}...{head}"
+
+    def get_page(page_number):
+        params = {"per_page": PAGE_SIZE, "page": page_number}
+        with api.profile("commits"):  # also in the threads of the executor
+            return api.request("GET", path, params=params).json()
+
+    first = get_page(1)
+    base_date = parse_timestamp(first["base_commit"]["commit"]["committer"]["date"])
+    pages = [first]
+    per_page = len(first["commits"])
+    if per_page > 0 and first.get("total_commits", 0) > per_page:
+        # GitHub may return fewer than PAGE_SIZE, use what it actually did.
+        n_pages = -(-first["total_commits"] // per_page)
+        page_numbers = range(2, n_pages + 1)
+        if executor is None:
+            pages += map(get_page, page_numbers)
+        else:
+            pages += executor.map(get_page, page_numbers)
+
+    commits = {}
+    for page in pages:
+        for c in page["commits"]:
+            commits[c["sha"]] = CommitRecord(
+                sha=c["sha"],
+                date=c["commit"]["committer"]["date"],
+                subject=subject(c["commit"]["message"]),
+                url=c["html_url"],
+            )
+    return commits, base_date, first.get("status")
+
+
+@_profiled("tags")
+def fetch_tags(api, owner, name):
+    """Return dictionary of all tags, keyed by name, with their commits."""
+    tags = {}
+    nodes = api.graphql_nodes(
+        TAGS_QUERY, dict(owner=owner, name=name), ("repository", "refs")
+    )
+    for node in nodes:
+        target = node["target"]
+        if "target" in target:  # annotated tag, peel to its commit
+            target = target["target"]
+        if "oid" not in target:  # tag of a tree or blob
+            continue
+        tags[node["name"]] = TagRecord(
+            name=node["name"],
+            sha=target["oid"],
+            date=parse_timestamp(target["committedDate"]),
+            url=f"{repo_url(target['url'])}/releases/tag/{node['name']}",
+            commit_url=target["url"],
+        )
+    return tags
+
+
+@_profiled("pulls")
+def fetch_pulls(api, owner, name, earliest, since=None):
+    """
+    Return dictionary of pull requests closed after 'earliest'.
+
+    Pull requests arrive most-recently updated first.  Closing a pull
+    request updates it, so once ``updatedAt`` is not after 'earliest'
+    no later page can hold a match and pagination stops.  The cost
+    scales with the size of the release, not the age of the repository.
+
+    With 'since', only pull requests updated after then are returned, open
+    ones too (with ``closed_at=None``) so that reopened pull requests can
+    be dropped.
+    """
+    pulls = {}
+    states = ["CLOSED", "MERGED"] if since is None else ["OPEN", "CLOSED", "MERGED"]
+    nodes = api.graphql_nodes(
+        PULLS_QUERY,
+        dict(owner=owner, name=name, states=states),
+        ("repository", "pullRequests"),
+    )
+    stop = max(earliest, since or earliest)
+    for node in nodes:
+        if parse_timestamp(node["updatedAt"]) <= stop:
+            break
+        closed_at = node["closedAt"] and parse_timestamp(node["closedAt"])
+        if closed_at is None or closed_at > earliest:
+            pulls[node["number"]] = PullRecord(
+                number=node["number"],
+                title=node["title"],
+                url=node["url"],
+                closed_at=closed_at,
+                merged=node["merged"],
+            )
+    return pulls
+
+
+@_profiled("issues")
+def fetch_milestone_issues(api, owner, name, milestone, since=None):
+    """
+    Return dictionary of the closed issues assigned to the milestone.
+
+    With 'since', only issues updated after then are returned, open ones
+    too (with ``closed_at=None``) so that reopened issues can be dropped.
+    """
+    issues = {}
+    variables = dict(owner=owner, name=name, number=milestone.number)
+    if since is None:
+        variables.update(states=["CLOSED"], since=None)
+    else:
+        variables.update(states=["OPEN", "CLOSED"], since=since.isoformat())
+    nodes = api.graphql_nodes(
+        MILESTONE_ISSUES_QUERY, variables, ("repository", "milestone", "issues")
+    )
+    for node in nodes:
+        issues[node["number"]] = IssueRecord(
+            number=node["number"],
+            title=node["title"],
+            url=node["url"],
+            closed_at=node["closedAt"] and parse_timestamp(node["closedAt"]),
+            labels=tuple(label["name"] for label in node["labels"]["nodes"]),
+        )
+    return issues
+
+
+def get_release_info(
+    token,
+    base_tag_name,
+    head_branch_name,
+    milestone_name,
+    api=None,
+    jobs=JOBS,
+    local=False,
+    milestone_number=None,
+    repository=None,
+):
+    """
+    Mine the Github API for information about this release.
+
+    Everything the report needs is fetched here, in a few paginated
+    GraphQL queries (and the REST compare endpoint for the commits).
+    The returned dictionaries hold compact records (such as
+    :class:`PullRecord`) with only the fields of the report.
+
+    The collections are independent and are fetched concurrently by
+    up to 'jobs' threads.  Pull requests wait for the date of the base
+    tag, issues wait for the milestone.
+
+    With 'local', commits and tags are read from the local clone instead.
+    With 'milestone_number', the milestone is not looked up by its name.
+    The 'repository' is an (organization, repository) tuple, by default
+    that of the clone in the current directory.
+    """
+    organization_name, repository_name = repository or getRepositoryInfo()
+    api = api or GitHubAPI(token, pool_size=jobs)
+    owner = dict(owner=organization_name, name=repository_name)
+    info, _earliest = _fetch_release_info(
+        api,
+        owner,
+        base_tag_name,
+        head_branch_name,
+        milestone_name,
+        jobs,
+        local,
+        milestone_number=milestone_number,
+    )
+    return info
+
+
+@_profiled("commits")
+def _fetch_commits(api, owner, base, head, executor, local):
+    """Return (commits, base_date, status) from the local clone or the API."""
+    if local:
+        return fetch_local_commits(base=base, head=head, **owner)
+    # first page here, then any other pages in the executor
+    return fetch_commits(api, base=base, head=head, executor=executor, **owner)
+
+
+class Deferred:
+    """The result of a future, transformed when it is first needed."""
+
+    def __init__(self, future, transform=None):
+        self.future = future
+        self.transform = transform or (lambda result: result)
+
+    def result(self):
+        return self.transform(self.future.result())
+
+
+def resolve(value):
+    """Return the result of a :class:`Deferred` (or a future) or the value."""
+    return value.result() if hasattr(value, "result") else value
+
+
+def start_release_info(
+    api,
+    owner,
+    base_tag_name,
+    head_branch_name,
+    milestone_name,
+    executor,
+    local=False,
+    milestone_number=None,
+):
+    """
+    Start fetching the release info with the 'executor'.
+
+    Returns as soon as the commits, repository and milestone are known.
+    Tags, pull requests, and issues are returned as :class:`Deferred`
+    results, still being fetched, so that a report can begin.  Returns
+    (repo, milestone, tags, pulls, issues, commits, earliest) where
+    'earliest' is the date of the base tag.
+    """
+    f_repo = executor.submit(
+        fetch_repository,
+        api,
+        milestone_name=milestone_name,
+        milestone_number=milestone_number,
+        **owner,
+    )
+    f_tags = executor.submit(_fetch_tags, api, owner, local)
+
+    commits, earliest, _status = _fetch_commits(
+        api, owner, base_tag_name, head_branch_name, executor, local
+    )
+    logger.debug(f"# commits: {len(commits)}")
+    f_pulls = executor.submit(fetch_pulls, api, earliest=earliest, **owner)
+
+    repo, milestone = f_repo.result()
+    logger.debug(f"repo: {repo}")
     if milestone is None:
         msg = f"Could not find milestone: {milestone_name}"
         logger.error(msg)
+        f_pulls.cancel()
+        f_tags.cancel()
         raise ValueError(msg)
     logger.debug(f"milestone: {milestone}")
+    f_issues = executor.submit(
+        fetch_milestone_issues, api, milestone=milestone, **owner
+    )
 
-    compare = repo.compare(base_tag_name, head_branch_name)
-    logger.debug(f"compare: {compare}")
+    def in_range(all_tags):
+        tags = {k: t for k, t in all_tags.items() if t.sha in commits}
+        logger.debug(f"# tags: {len(tags)}")
+        return tags
 
-    commits = {c.sha: c for c in compare.commits}
-    logger.debug(f"# commits: {len(commits)}")
+    def not_pulls(milestone_issues):
+        pulls = f_pulls.result()
+        issues = {k: i for k, i in milestone_issues.items() if k not in pulls}
+        logger.debug(f"# issues: {len(issues)}")
+        return issues
 
-    tags = {}
-    earliest = None
-    for t in repo.get_tags():
-        if t.commit.sha in commits:
-            tags[t.name] = t
-        elif t.name == base_tag_name:
-            commit = repo.get_commit(t.commit.sha)
-            dt = commit.last_modified_datetime
-            earliest = min(dt, earliest or dt)
-    logger.debug(f"# tags: {len(tags)}")
-
-    pulls = {
-        p.number: p for p in repo.get_pulls(state="closed") if p.closed_at > earliest
+    tags = Deferred(f_tags, in_range)
+    pulls = Deferred(f_pulls)
+    issues = Deferred(f_issues, not_pulls)
+    return repo, milestone, tags, pulls, issues, commits, earliest
+
+
+def _fetch_release_info(
+    api,
+    owner,
+    base_tag_name,
+    head_branch_name,
+    milestone_name,
+    jobs,
+    local=False,
+    milestone_number=None,
+):
+    """Return (info, earliest) where 'earliest' is the date of the base tag."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        *info, earliest = start_release_info(
+            api,
+            owner,
+            base_tag_name,
+            head_branch_name,
+            milestone_name,
+            executor,
+            local=local,
+            milestone_number=milestone_number,
+        )
+        info = tuple(resolve(item) for item in info)
+    return info, earliest
+
+
+def snapshot_path(owner, name, base_tag_name, milestone_name):
+    """Return the file with the snapshot of this release's data."""
+    key = json.dumps([owner, name, base_tag_name, milestone_name])
+    digest = hashlib.sha256(key.encode("utf8")).hexdigest()[:16]
+    return SNAPSHOT_DIR / f"{owner}_{name}_{digest}.json"
+
+
+def save_snapshot(path, snapshot):
+    """Write the snapshot as JSON (records as arrays, timestamps in ISO8601)."""
+
+    def encode(obj):
+        if isinstance(obj, datetime.datetime):
+            return obj.isoformat()
+        raise TypeError(f"Cannot save {obj!r}")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as fp:
+        json.dump(snapshot, fp, default=encode)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path):
+    """Read a snapshot written by :func:`save_snapshot`, None if absent."""
+    if not path.exists():
+        return None
+    with open(path) as fp:
+        snapshot = json.load(fp)
+
+    # Records were saved as JSON arrays, rebuild them.
+    snapshot["repo"] = Repository(*snapshot["repo"])
+    snapshot["milestone"] = Milestone(*snapshot["milestone"])
+    snapshot["commits"] = {k: CommitRecord(*v) for k, v in snapshot["commits"].items()}
+    snapshot["tags"] = {
+        k: TagRecord(*v)._replace(date=parse_timestamp(v[2]))
+        for k, v in snapshot["tags"].items()
     }
-    logger.debug(f"# pulls: {len(pulls)}")
+    snapshot["pulls"] = {
+        int(k): PullRecord(*v)._replace(closed_at=parse_timestamp(v[3]))
+        for k, v in snapshot["pulls"].items()
+    }
+    snapshot["issues"] = {
+        int(k): IssueRecord(*v)._replace(
+            closed_at=parse_timestamp(v[3]), labels=tuple(v[4])
+        )
+        for k, v in snapshot["issues"].items()
+    }
+    for key in ("earliest", "fetched_at"):
+        snapshot[key] = parse_timestamp(snapshot[key])
+    return snapshot
+
+
+def get_release_info_incremental(
+    token,
+    base_tag_name,
+    head_branch_name,
+    milestone_name,
+    api=None,
+    jobs=JOBS,
+    local=False,
+    milestone_number=None,
+    repository=None,
+):
+    """
+    Like :func:`get_release_info`, fetching only what changed since last run.
+
+    The data of each run is saved as a snapshot (one per repository, base
+    tag and milestone).  The next run requests only the commits after the
+    previous head, and the pull requests and issues updated since the
+    previous run, then merges them into the snapshot.  Tags are cheap (a
+    page per 100) and are fetched in full.  Without a snapshot, or when
+    the new head is not ahead of the previous one, everything is fetched.
+    """
+    organization_name, repository_name = repository or getRepositoryInfo()
+    # 'fetched_at' is recorded as the start of this run, so no response may
+    # be older: a fresh cache entry could miss what changed since it was saved.
+    api = (api or GitHubAPI(token, pool_size=jobs)).revalidating()
+    owner = dict(owner=organization_name, name=repository_name)
+    path = snapshot_path(
+        organization_name, repository_name, base_tag_name, milestone_name
+    )
+    # Allow for clock skew between here and GitHub.
+    started = datetime.datetime.now(datetime.timezone.utc) - SNAPSHOT_SKEW
 
+    snapshot = load_snapshot(path)
+    info = None
+    if snapshot is not None and snapshot["head_sha"] is not None:
+        info = _update_snapshot(
+            snapshot, api, head_branch_name, jobs, owner, local=local
+        )
+    if info is None:
+        logger.debug("snapshot: full fetch")
+        info, earliest = _fetch_release_info(
+            api,
+            owner,
+            base_tag_name,
+            head_branch_name,
+            milestone_name,
+            jobs,
+            local,
+            milestone_number=milestone_number,
+        )
+        snapshot = dict(earliest=earliest)
+
+    repo, milestone, tags, pulls, issues, commits = info
+    snapshot.update(
+        fetched_at=started,
+        head_sha=next(reversed(commits)) if commits else None,
+        repo=repo,
+        milestone=milestone,
+        tags=tags,
+        pulls=pulls,
+        issues=issues,
+        commits=commits,
+    )
+    save_snapshot(path, snapshot)
+    return info
+
+
+def _update_snapshot(snapshot, api, head_branch_name, jobs, owner, local=False):
+    """Merge changes since the snapshot, None if a full fetch is needed."""
+    since = snapshot["fetched_at"]
+    milestone = snapshot["milestone"]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        f_tags = executor.submit(_fetch_tags, api, owner, local)
+        f_pulls = executor.submit(
+            fetch_pulls, api, earliest=snapshot["earliest"], since=since, **owner
+        )
+        f_issues = executor.submit(
+            fetch_milestone_issues, api, milestone=milestone, since=since, **owner
+        )
+        new_commits, _date, status = _fetch_commits(
+            api, owner, snapshot["head_sha"], head_branch_name, executor, local
+        )
+        if status not in ("ahead", "identical"):
+            logger.debug("snapshot: head is %s, cannot update", status)
+            for future in (f_tags, f_pulls, f_issues):
+                future.cancel()
+            return None
+
+        commits = {**snapshot["commits"], **new_commits}
+        tags = {k: t for k, t in f_tags.result().items() if t.sha in commits}
+        pulls = dict(snapshot["pulls"])
+        pulls.update(f_pulls.result())
+        issues = dict(snapshot["issues"])
+        issues.update(f_issues.result())
+    pulls = {k: p for k, p in pulls.items() if p.closed_at is not None}
     issues = {
-        i.number: i
-        for i in repo.get_issues(milestone=milestone, state="closed")
-        if ((milestone is not None or i.closed_at > earliest) and i.number not in pulls)
+        k: i for k, i in issues.items() if i.closed_at is not None and k not in pulls
     }
-    logger.debug(f"# issues: {len(issues)}")
-
-    return repo, milestone, tags, pulls, issues, commits
+    logger.debug(
+        "snapshot: +%d commits, %d pulls & %d issues updated",
+        len(new_commits),
+        len(f_pulls.result()),
+        len(f_issues.result()),
+    )
+    return snapshot["repo"], milestone, tags, pulls, issues, commits
 
 
 def parse_command_line():
@@ -166,116 +1571,436 @@ def parse_command_line():
         default="master",
     )
 
+    parser.add_argument(
+        "-m",
+        "--milestone-number",
+        action="store",
+        type=int,
+        default=None,
+        help="number of the milestone (skips looking it up by name)",
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        action="store",
+        default=None,
+        help="write the report to this file (default: stdout)",
+    )
+
+    parser.add_argument(
+        "-f",
+        "--format",
+        action="store",
+        choices=sorted(REPORT_WRITERS),
+        default=None,
+        help="report format (default: from the output file suffix, or markdown)",
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="do not read or write the on-disk cache of GitHub responses",
+    )
+
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        default=False,
+        help="revalidate every cached GitHub response",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="fetch only what changed since the previous run of this release",
+    )
+
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        default=False,
+        help="read commits and tags from the local git clone (no API requests)",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="FILE",
+        help=(
+            "count and time the requests of each phase;"
+            " write a summary (default: on stderr)"
+            " or, to a .json file, the summary and trace events"
+        ),
+    )
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record",
+        action="store",
+        metavar="CASSETTE",
+        default=None,
+        help="save the GitHub responses to this file (for --replay)",
+    )
+    group.add_argument(
+        "--replay",
+        action="store",
+        metavar="CASSETTE",
+        default=None,
+        help="replay the GitHub responses from this file (no network)",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        type=int,
+        default=JOBS,
+        help=f"number of concurrent GitHub requests (default={JOBS})",
+    )
+
     return parser.parse_args()
 
 
-def report(title, repo, milestone, tags, pulls, issues, commits):
-    """Print results to stdout."""
+class ReportWriter:
+    """
+    Base class: write the release report to a text stream.
+
+    The report is written one part at a time, in this order:
+    :meth:`header`, (:meth:`summary` when ``summary_first``),
+    :meth:`section` for each section, (:meth:`summary`), and :meth:`end`.
+    A section's rows are written as they are generated, nothing else
+    is kept.
+
+    A table cell is text or a (text, url) link.
+    """
+
+    summary_first = False
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, text=""):
+        self.stream.write(f"{text}\n")
+
+    def header(self, title, items):
+        """Title and list of (label, value) items."""
+
+    def anchor(self, title):
+        """Link target of the section summarized as 'title'."""
+        return "tags" if title == "New Tags" else title.lower().replace(" ", "-")
+
+    def summary(self, rows):
+        """Table of (section title, quantity) rows."""
+
+    def section(self, title, columns, rows):
+        """Table of rows (None when there is nothing to report)."""
+
+    def end(self):
+        self.stream.flush()
+
+
+class MarkdownWriter(ReportWriter):
+    """Release report in Markdown (the default)."""
+
+    summary_first = True
     hbar = "-" * 3
-    print(f"## {title}")
-    print("")
-    print(f"* **date/time**: {datetime.datetime.now()}")
-    # just a suggestion, the latest release
-    rr = repo.get_releases()
-    print(f"* **release**: []({rr[0].html_url})")
-    print(f"* **documentation**: {repo.homepage}")
-    if milestone is not None:
-        print(f"* **milestone**: [{milestone.title}]({milestone.url})")
-        print("")
-    print("section | quantity")
-    print(hbar, " | ", hbar)
-    print(f"[New Tags](#tags) | {len(tags)}")
-    print(f"[Pull Requests](#pull-requests) | {len(pulls)}")
-    print(f"[Issues](#issues) | {len(issues)}")
-    print(f"[Commits](#commits) | {len(commits)}")
-    print("")
-    print("### Tags")
-    print("")
-    if len(tags) == 0:
-        print("-- none --")
-    else:
-        print("tag | date | commit")
-        print(hbar, " | ", hbar, " | ", hbar)
-
-        def sorter(item):
-            tag = item[1]
-            commit = repo.get_commit(tag.commit.sha)
-            return commit.last_modified_datetime
-
-        for k, tag in sorted(tags.items(), reverse=True, key=sorter):
-            commit = repo.get_commit(tag.commit.sha)
-            when = commit.last_modified_datetime.strftime("%Y-%m-%d")
-            base_url = tag.commit.html_url
-            tag_url = "/".join(base_url.split("/")[:-2] + ["releases", "tag", k])
-            print(
-                f"[{k}]({tag_url})"
-                f" | {when}"
-                f" | [{tag.commit.sha[:7]}]({tag.commit.html_url})"
-            )
-    print("")
-    print("### Pull Requests")
-    print("")
-    if len(pulls) == 0:
-        print("-- none --")
-    else:
-        print("pull request | date | state | title")
-        print(hbar, " | ", hbar, " | ", hbar, " | ", hbar)
-        for k, pull in sorted(pulls.items(), reverse=True):
-            state = {True: "merged", False: "closed"}[pull.merged]
-            when = pull.closed_at.isoformat(sep=" ").split()[0]
-            print(
-                f"[#{pull.number}]({pull.html_url})"
-                f" | {when}"
-                f" | {state}"
-                f" | {pull.title}"
+
+    def cell(self, value):
+        if isinstance(value, tuple):
+            text, url = value
+            return f"[{text}]({url})"
+        return str(value)
+
+    def table_head(self, columns):
+        self.write(" | ".join(columns))
+        self.write("  |  ".join([self.hbar] * len(columns)))
+
+    def header(self, title, items):
+        self.write(f"## {title}")
+        self.write()
+        for label, value in items:
+            self.write(f"* **{label}**: {self.cell(value)}")
+        if items[-1][0] == "milestone":
+            self.write()
+
+    def summary(self, rows):
+        self.table_head(["section", "quantity"])
+        for title, quantity in rows:
+            self.write(f"[{title}](#{self.anchor(title)}) | {quantity}")
+        self.write()
+
+    def section(self, title, columns, rows):
+        self.write(f"### {title}")
+        self.write()
+        if rows is None:
+            self.write("-- none --")
+        else:
+            self.table_head(columns)
+            for row in rows:
+                self.write(" | ".join(self.cell(value) for value in row))
+        if title != "Commits":
+            self.write()
+
+
+class JSONWriter(ReportWriter):
+    """Release report as one JSON document, written incrementally."""
+
+    def key(self, title):
+        return title.lower().replace(" ", "_").replace("/", "_")
+
+    def header(self, title, items):
+        self.stream.write("{" + f'"title": {json.dumps(title)}')
+        for label, value in items:
+            if isinstance(value, tuple):
+                value = dict(zip(("text", "url"), value))
+            value = json.dumps(value, default=str)
+            self.stream.write(f", {json.dumps(self.key(label))}: {value}")
+
+    def summary(self, rows):
+        summary = {self.key(title): quantity for title, quantity in rows}
+        self.stream.write(f', "summary": {json.dumps(summary)}')
+
+    def section(self, title, columns, rows):
+        self.stream.write(f", {json.dumps(self.key(title))}: [")
+        for i, row in enumerate(rows or []):
+            record = {}
+            for column, value in zip(columns, row):
+                key = self.key(column)
+                if isinstance(value, tuple):
+                    value, record[f"{key}_url"] = value
+                record[key] = value
+            self.stream.write(("\n  " if i == 0 else ",\n  ") + json.dumps(record))
+        self.stream.write("]")
+        self.stream.flush()
+
+    def end(self):
+        self.write("}")
+        super().end()
+
+
+class HTMLWriter(ReportWriter):
+    """Release report as an HTML document."""
+
+    def cell(self, value):
+        if isinstance(value, tuple):
+            text, url = value
+            return f'<a href="{html.escape(url)}">{html.escape(str(text))}</a>'
+        return html.escape(str(value))
+
+    def table(self, columns, rows):
+        self.write("<table>")
+        self.write("<tr>" + "".join(f"<th>{html.escape(c)}</th>" for c in columns))
+        for row in rows:
+            self.write("<tr>" + "".join(f"<td>{self.cell(v)}</td>" for v in row))
+        self.write("</table>")
+
+    def header(self, title, items):
+        self.write("<!DOCTYPE html>")
+        self.write("<html><head><meta charset='utf-8'>")
+        self.write(f"<title>{html.escape(title)}</title></head><body>")
+        self.write(f"<h2>{html.escape(title)}</h2>")
+        self.write("<ul>")
+        for label, value in items:
+            self.write(f"<li><b>{html.escape(label)}</b>: {self.cell(value)}</li>")
+        self.write("</ul>")
+
+    def summary(self, rows):
+        self.write("<h3 id='summary'>Summary</h3>")
+        self.table(
+            ["section", "quantity"],
+            [((t, "#" + self.anchor(t)), q) for t, q in rows],
+        )
+
+    def section(self, title, columns, rows):
+        self.write(f"<h3 id='{self.anchor(title)}'>{html.escape(title)}</h3>")
+        if rows is None:
+            self.write("<p>-- none --</p>")
+        else:
+            self.table(columns, rows)
+        self.stream.flush()
+
+    def end(self):
+        self.write("</body></html>")
+        super().end()
+
+
+REPORT_WRITERS = dict(markdown=MarkdownWriter, json=JSONWriter, html=HTMLWriter)
+
+
+def _tag_rows(tags):
+    for k, tag in sorted(tags.items(), reverse=True, key=lambda item: item[1].date):
+        yield (
+            (k, tag.url),
+            tag.date.strftime("%Y-%m-%d"),
+            (tag.sha[:7], tag.commit_url),
+        )
+
+
+def _pull_rows(pulls):
+    for _k, pull in sorted(pulls.items(), reverse=True):
+        yield (
+            (f"#{pull.number}", pull.url),
+            pull.closed_at.isoformat(sep=" ").split()[0],
+            {True: "merged", False: "closed"}[pull.merged],
+            pull.title,
+        )
+
+
+def _issue_rows(issues, pulls):
+    def isorter(o):
+        k, v = o
+        logger.debug("[closed: %s] %d %s", v.closed_at, k, v.title)
+        return v.closed_at
+
+    for k, issue in sorted(issues.items(), key=isorter, reverse=True):
+        if k not in pulls:
+            yield (
+                (f"#{issue.number}", issue.url),
+                issue.closed_at.strftime("%Y-%m-%d"),
+                ", ".join(issue.labels),
+                issue.title,
             )
-    print("")
-    print("### Issues")
-    print("")
-    if len(issues) == 0:
-        print("-- none --")
-    else:
 
-        def isorter(o):
-            k, v = o
-            logger.debug("[closed: %s] %d %s", v.closed_at, k, v.title)
-            return v.closed_at
-
-        print("issue | date | label(s) | title")
-        print(hbar, " | ", hbar, " | ", hbar, " | ", hbar)
-        for k, issue in sorted(issues.items(), key=isorter, reverse=True):
-            if k not in pulls:
-                when = issue.closed_at.strftime("%Y-%m-%d")
-                labels = ", ".join([_label.name for _label in issue.labels])
-                print(
-                    f"[#{issue.number}]({issue.html_url})"
-                    f" | {when}"
-                    f" | {labels}"
-                    f" | {issue.title}"
-                )
-    print("")
-    print("### Commits")
-    print("")
-    if len(commits) == 0:
-        print("-- none --")
-    else:
 
-        def csorter(o):
-            k, v = o
-            ts = v.raw_data["commit"]["committer"]["date"]
-            logger.debug("[closed: %s] %s", ts, k)
-            return v.raw_data["commit"]["committer"]["date"]
+def _commit_rows(commits):
+    def csorter(o):
+        k, v = o
+        logger.debug("[closed: %s] %s", v.date, k)
+        return v.date
+
+    for k, commit in sorted(commits.items(), key=csorter, reverse=True):
+        yield (
+            (k[:7], commit.url),
+            commit.date.split("T")[0],
+            commit.subject,
+        )
+
+
+def write_release_notes(
+    token,
+    base_tag_name,
+    head_branch_name,
+    milestone_name,
+    writer=None,
+    api=None,
+    jobs=JOBS,
+    local=False,
+    milestone_number=None,
+    repository=None,
+):
+    """
+    Fetch the release info and write its report, streaming each section.
+
+    Like ``report(milestone_name, *get_release_info(...))`` except that
+    the report begins while tags, pull requests, and issues are fetched.
+    """
+    organization_name, repository_name = repository or getRepositoryInfo()
+    api = api or GitHubAPI(token, pool_size=jobs)
+    owner = dict(owner=organization_name, name=repository_name)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        *info, _earliest = start_release_info(
+            api,
+            owner,
+            base_tag_name,
+            head_branch_name,
+            milestone_name,
+            executor,
+            local=local,
+            milestone_number=milestone_number,
+        )
+        report(milestone_name, *info, writer=writer, profiler=api.profiler)
+
+
+def report(
+    title,
+    repo,
+    milestone,
+    tags,
+    pulls,
+    issues,
+    commits,
+    writer=None,
+    profiler=None,
+):
+    """
+    Write the report (default: Markdown to stdout).
 
-        print("commit | date | message")
-        print(hbar, " | ", hbar, " | ", hbar)
-        for k, commit in sorted(commits.items(), key=csorter, reverse=True):
-            message = commit.commit.message.splitlines()[0]
-            when = commit.raw_data["commit"]["committer"]["date"].split("T")[0]
-            print(f"[{k[:7]}]({commit.html_url}) | {when} | {message}")
+    Any of the collections may be a :class:`Deferred` result, still being
+    fetched.  Each section is written as soon as its data is available,
+    except that :class:`MarkdownWriter` puts the summary table (which
+    needs every collection) first.  With a :class:`Profiler`, the time
+    of each section (including waiting for its data) is a phase.
+    """
+    writer = writer or MarkdownWriter()
+    phase = contextlib.nullcontext if profiler is None else profiler.phase
+    items = [
+        ("date/time", datetime.datetime.now()),
+        # just a suggestion, the latest release
+        ("release", ("", repo.release_url)),
+        ("documentation", repo.homepage),
+    ]
+    if milestone is not None:
+        items.append(("milestone", (milestone.title, milestone.url)))
+    writer.header(title, items)
+
+    def summary():
+        writer.summary(
+            [
+                ("New Tags", len(resolve(tags))),
+                ("Pull Requests", len(resolve(pulls))),
+                ("Issues", len(resolve(issues))),
+                ("Commits", len(resolve(commits))),
+            ]
+        )
+
+    if writer.summary_first:
+        with phase("report: Summary"):
+            summary()
+    sections = [
+        ("Tags", ["tag", "date", "commit"], tags, _tag_rows),
+        (
+            "Pull Requests",
+            ["pull request", "date", "state", "title"],
+            pulls,
+            _pull_rows,
+        ),
+        (
+            "Issues",
+            ["issue", "date", "label(s)", "title"],
+            issues,
+            lambda i: _issue_rows(i, resolve(pulls)),
+        ),
+        ("Commits", ["commit", "date", "message"], commits, _commit_rows),
+    ]
+    for section_title, columns, data, rows in sections:
+        with phase(f"report: {section_title}"):
+            data = resolve(data)
+            writer.section(section_title, columns, rows(data) if len(data) else None)
+    if not writer.summary_first:
+        with phase("report: Summary"):
+            summary()
+    writer.end()
+
+
+def report_format(output=None, fmt=None):
+    """Return the report format, as given or from the output file suffix."""
+    if fmt is None:
+        suffix = pathlib.Path(output or "").suffix.lower()
+        fmt = {".json": "json", ".htm": "html", ".html": "html"}.get(suffix)
+    return fmt or "markdown"
 
 
 def main(base=None, head=None, milestone=None, token=None, debug=False):
     """Command-line application program."""
+    use_cache, refresh, jobs, incremental, local = True, False, JOBS, False, False
+    output, fmt, milestone_number = None, None, None
+    record, replay, profile = None, None, None
     if debug:
         base_tag_name = base
         head_branch_name = head
@@ -287,11 +2012,42 @@ def main(base=None, head=None, milestone=None, token=None, debug=False):
         head_branch_name = cmd.head
         milestone_name = cmd.milestone
         token = cmd.token
+        use_cache, refresh, jobs = not cmd.no_cache, cmd.refresh, max(1, cmd.jobs)
+        incremental, local = cmd.incremental, cmd.local
+        output, fmt, milestone_number = cmd.output, cmd.format, cmd.milestone_number
+        record, replay, profile = cmd.record, cmd.replay, cmd.profile
         logger.setLevel(logging.WARNING)
 
-    info = get_release_info(token, base_tag_name, head_branch_name, milestone_name)
-    # milestone, repo, tags, pulls, issues, commits = info
-    report(milestone_name, *info)
+    session = None
+    if record is not None:
+        session = Cassette(record, session=GitHubAPI.new_session(jobs))
+    elif replay is not None:
+        session = Cassette(replay)
+    # A cassette sees every request: the cache would hide some.
+    use_cache = use_cache and session is None
+    cache = ResponseCache(refresh=refresh) if use_cache else None
+    profiler = None if profile is None else Profiler()
+    api = GitHubAPI(
+        token, session=session, cache=cache, pool_size=jobs, profiler=profiler
+    )
+    stream = sys.stdout if output is None else open(output, "w")
+    writer = REPORT_WRITERS[report_format(output, fmt)](stream)
+    args = (token, base_tag_name, head_branch_name, milestone_name)
+    kwargs = dict(api=api, jobs=jobs, local=local, milestone_number=milestone_number)
+    try:
+        if incremental:
+            info = get_release_info_incremental(*args, **kwargs)
+            # milestone, repo, tags, pulls, issues, commits = info
+            report(milestone_name, *info, writer=writer, profiler=profiler)
+        else:
+            write_release_notes(*args, writer=writer, **kwargs)
+    finally:
+        if output is not None:
+            stream.close()
+        if record is not None:
+            session.save()
+        if profiler is not None:
+            profiler.write(profile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,342 @@
+"""
+Read information from the local clone of a git repository.
+
+Commands of the ``git`` program are run in (or above) a given directory.
+Long output is streamed, one record at a time, so very large histories
+are read in bounded memory.
+
+.. autosummary::
+
+    ~git
+    ~iter_commits
+    ~iter_files
+    ~iter_changed_files
+    ~tag_index
+    ~read_tag_refs
+    ~commit_date
+    ~commit_before
+    ~resolve_commit
+    ~is_ancestor
+    ~is_shallow
+    ~GitError
+"""
+
+import datetime
+import os
+import pathlib
+import subprocess
+
+GIT = "git"
+UTC_FORMAT = "format-local:%Y-%m-%dT%H:%M:%SZ"  # same as the GitHub API
+
+
+class GitError(RuntimeError):
+    """A git command failed."""
+
+
+def _environment():
+    """Environment for git commands: UTC dates, no pager, no prompts."""
+    env = dict(os.environ)
+    env.update(TZ="UTC", GIT_PAGER="cat", GIT_TERMINAL_PROMPT="0")
+    return env
+
+
+def git(*args, cwd=None):
+    """Return the standard output of a git command."""
+    try:
+        result = subprocess.run(
+            [GIT, *args],
+            cwd=cwd,
+            env=_environment(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=False,
+        )
+    except FileNotFoundError as exinfo:
+        raise GitError(f"Cannot run {GIT!r}: {exinfo}") from exinfo
+    if result.returncode != 0:
+        raise GitError(f"git {' '.join(args)}: {result.stderr.strip()}")
+    return result.stdout
+
+
+def resolve_commit(ref, cwd=None):
+    """
+    Return the SHA of the commit named by 'ref', None if not known locally.
+
+    A branch that exists only on the ``origin`` remote is also found.
+    """
+    for candidate in (ref, f"origin/{ref}"):
+        try:
+            return git(
+                "rev-parse", "--verify", "--quiet", f"{candidate}^{{commit}}", cwd=cwd
+            ).strip()
+        except GitError:
+            continue
+    return None
+
+
+def commit_date(ref, cwd=None):
+    """Return the committer date of a commit, in UTC, as by the GitHub API."""
+    return git(
+        "log", "-1", f"--date={UTC_FORMAT}", "--format=%cd", ref, cwd=cwd
+    ).strip()
+
+
+def commit_before(date, ref="HEAD", cwd=None):
+    """
+    Return the SHA of the last commit (of 'ref') before 'date', None if none.
+
+    Give 'date' a time and a time zone (``2024-01-01 00:00:00 +0000``):
+    git reads a date alone as that day at the current time of day.
+    """
+    sha = git("rev-list", "-1", f"--before={date}", ref, "--", cwd=cwd).strip()
+    return sha or None
+
+
+def is_ancestor(ancestor, descendant, cwd=None):
+    """Is commit 'ancestor' in the history of commit 'descendant'?"""
+    try:
+        git("merge-base", "--is-ancestor", ancestor, descendant, cwd=cwd)
+    except GitError:
+        return False
+    return True
+
+
+def is_shallow(cwd=None):
+    """Is the clone shallow (its history truncated)?"""
+    return git("rev-parse", "--is-shallow-repository", cwd=cwd).strip() == "true"
+
+
+def git_dir(cwd=None):
+    """Return the (common) ``.git`` directory of the clone."""
+    path = pathlib.Path(git("rev-parse", "--git-common-dir", cwd=cwd).strip())
+    if not path.is_absolute():
+        path = pathlib.Path(cwd or os.getcwd()) / path
+    return path
+
+
+def read_tag_refs(path):
+    """
+    Return {name: (sha, peeled)} of the tags in ``.git`` directory 'path'.
+
+    Tags are read from ``packed-refs`` and the loose ``refs/tags/`` files
+    (a loose ref takes precedence).  'peeled' is the commit of an annotated
+    tag when ``packed-refs`` records it, otherwise None.
+    """
+    path = pathlib.Path(path)
+    prefix = "refs/tags/"
+    refs = {}
+
+    packed = path / "packed-refs"
+    if packed.exists():
+        name = None
+        for line in packed.read_text(errors="replace").splitlines():
+            if line.startswith("#") or not line.strip():
+                continue
+            if line.startswith("^"):  # peeled object of the previous ref
+                if name is not None:
+                    refs[name] = (refs[name][0], line[1:].strip())
+                continue
+            sha, ref = line.split(maxsplit=1)
+            name = ref[len(prefix) :] if ref.startswith(prefix) else None
+            if name is not None:
+                refs[name] = (sha, None)
+
+    tags_dir = path / "refs" / "tags"
+    for root, _dirs, files in os.walk(tags_dir):
+        for filename in files:
+            ref_file = pathlib.Path(root) / filename
+            name = ref_file.relative_to(tags_dir).as_posix()
+            sha = ref_file.read_text().strip()
+            if len(sha) == 40:  # not a symbolic ref
+                refs[name] = (sha, None)
+    return refs
+
+
+class _CatFile:
+    """One ``git cat-file --batch`` process, reads many objects."""
+
+    def __init__(self, cwd=None):
+        self.process = subprocess.Popen(
+            [GIT, "cat-file", "--batch"],
+            cwd=cwd,
+            env=_environment(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def read(self, sha):
+        """Return (type, content) of the object."""
+        self.process.stdin.write(f"{sha}\n".encode())
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().decode().split()
+        if len(header) != 3:  # "<sha> missing"
+            raise GitError(f"Object not found: {sha}")
+        _sha, kind, size = header
+        content = self.process.stdout.read(int(size) + 1)[:-1]  # and newline
+        return kind, content.decode("utf8", errors="replace")
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def _signature_date(line):
+    """Date (UTC, GitHub API format) of 'tagger' or 'committer' header line."""
+    epoch = int(line.rsplit(maxsplit=2)[-2])
+    when = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+    return when.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _headers(content):
+    """Return the header lines of a commit or tag object, by keyword."""
+    headers = {}
+    for line in content.split("\n"):
+        if not line:  # blank line ends the headers
+            break
+        keyword, _, value = line.partition(" ")
+        headers.setdefault(keyword, value)
+    return headers
+
+
+def tag_index(cwd=None):
+    """
+    Return {name: tag} of all tags in the local clone, with their commits.
+
+    Each tag is a dictionary with keys: ``name``, ``sha`` (the commit),
+    ``date`` (the commit's committer date), and ``tagger_date`` (None
+    for a lightweight tag).  Annotated tags are peeled to their commit.
+    Refs are read from the files of the ``.git`` directory, objects by
+    a single ``git cat-file --batch`` process.  Tags of trees or blobs
+    are skipped.
+    """
+    index = {}
+    cat_file = _CatFile(cwd=cwd)
+    try:
+        for name, (sha, _peeled) in read_tag_refs(git_dir(cwd)).items():
+            tagger_date = None
+            kind, content = cat_file.read(sha)
+            while kind == "tag":  # annotated, possibly a tag of a tag
+                headers = _headers(content)
+                if tagger_date is None and "tagger" in headers:
+                    tagger_date = _signature_date(headers["tagger"])
+                sha = headers["object"]
+                kind, content = cat_file.read(sha)
+            if kind != "commit":
+                continue
+            index[name] = {
+                "name": name,
+                "sha": sha,
+                "date": _signature_date(_headers(content)["committer"]),
+                "tagger_date": tagger_date,
+            }
+    finally:
+        cat_file.close()
+    return index
+
+
+def _iter_fields(args, cwd=None, errors="replace"):
+    """
+    Yield the NUL-terminated fields of a git command's output, as written.
+
+    Bytes that are not UTF-8 are decoded by the 'errors' handler.
+    Raise :class:`GitError` (after the last field) if the command fails.
+    """
+    with subprocess.Popen(
+        [GIT, *args],
+        cwd=cwd,
+        env=_environment(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    ) as process:
+        buffer = b""
+        for chunk in iter(lambda: process.stdout.read(2**16), b""):
+            buffer += chunk
+            *complete, buffer = buffer.split(b"\0")
+            for field in complete:
+                yield field.decode("utf8", errors=errors)
+        stderr = process.stderr.read().decode("utf8", errors="replace")
+    if process.returncode != 0:
+        raise GitError(f"git {' '.join(args)}: {stderr.strip()}")
+
+
+def iter_commits(base, head, cwd=None):
+    """
+    Yield (sha, date, message) of each commit in ``base..head``, oldest first.
+
+    The committer 'date' is in UTC, formatted as by the GitHub API.
+    Commits are streamed from ``git log`` as it writes them.
+    """
+    args = [
+        "log",
+        "--reverse",
+        f"--date={UTC_FORMAT}",
+        "--format=%H%x00%cd%x00%B%x00",
+        "-z",
+        f"{base}..{head}",
+        "--",
+    ]
+    fields = []
+    for field in _iter_fields(args, cwd=cwd):
+        fields.append(field)
+        if len(fields) == 4:  # "%B%x00" and "-z" end each record
+            sha, date, message, _ = fields
+            fields = []
+            yield sha.strip(), date, message
+
+
+def iter_files(cwd=None, untracked=False):
+    """
+    Yield the path of each file in the git index, under directory 'cwd'.
+
+    Paths are relative to 'cwd', read from ``git ls-files`` as it writes
+    them.  Submodules (and symbolic links) are skipped.  With 'untracked',
+    also yield the files not yet added, except those ignored by
+    ``.gitignore`` (or ``.git/info/exclude``, or ``core.excludesFile``).
+    """
+    previous = None
+    args = ["ls-files", "-z", "--stage"]
+    for field in _iter_fields(args, cwd=cwd, errors="surrogateescape"):
+        info, path = field.split("\t", 1)  # "mode sha stage\tpath"
+        mode = info.split()[0]
+        if path == previous or mode in ("160000", "120000"):
+            continue  # a conflict (more stages), a submodule, or a link
+        previous = path
+        yield path
+    if untracked:
+        args = ["ls-files", "-z", "--others", "--exclude-standard"]
+        yield from _iter_fields(args, cwd=cwd, errors="surrogateescape")
+
+
+def iter_changed_files(ref, cwd=None, untracked=False):
+    """
+    Yield the path of each file changed since commit 'ref', under directory 'cwd'.
+
+    Changes committed since 'ref' and changes not committed yet (staged or
+    not) are read from ``git diff --raw`` as it writes them.  Paths are
+    relative to 'cwd'.  Deleted files, submodules, and symbolic links are
+    skipped.  With 'untracked', also yield the files not yet added, except
+    those ignored.
+    """
+    args = ["diff", "-z", "--raw", "--no-renames", "--relative", ref, "--"]
+    fields = _iter_fields(args, cwd=cwd, errors="surrogateescape")
+    for info, path in zip(fields, fields):  # ":old new sha sha status", path
+        new_mode, status = info.split()[1], info.split()[-1]
+        if status == "D" or new_mode in ("160000", "120000"):
+            continue
+        yield path
+    if untracked:
+        args = ["ls-files", "-z", "--others", "--exclude-standard"]
+        yield from _iter_fields(args, cwd=cwd, errors="surrogateescape")
+
+
+# -----------------------------------------------------------------------------
+# :author:    Pete R. Jemian
+# :email:     prjemian@gmail.com
+# :copyright: (c) 2014-2024, Pete R. Jemian
+#
+# Distributed under the terms of the Creative Commons Attribution 4.0 International Public License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
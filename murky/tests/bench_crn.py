@@ -0,0 +1,214 @@
+"""
+Benchmark create_release_notes, offline, with synthetic repositories.
+
+A synthetic repository has *n* each of commits, tags, pull requests,
+and milestone issues.  Its GitHub responses are recorded once to a
+:class:`~murky.create_release_notes.Cassette` then replayed, so no
+network is used.  For each phase (fetch the release info, write each
+report format) this reports the wall time, the number of requests,
+and the peak memory allocated by Python.  Time and memory are measured
+in separate runs (memory tracing slows Python down).
+
+Run from the command line::
+
+    python -m murky.tests.bench_crn
+    python -m murky.tests.bench_crn --sizes 100 10000 --jobs 4 --json bench.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+from .. import create_release_notes as crn
+from .test_crn import FakeGitHub
+from .test_crn import FakeResponse
+
+SIZES = (100, 10_000, 100_000)
+START = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def timestamp(minutes):
+    """GitHub API timestamp, 'minutes' after START."""
+    when = START + datetime.timedelta(minutes=minutes)
+    return when.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class SyntheticGitHub(FakeGitHub):
+    """
+    Stand-in for requests.Session, serves a repository of 'n' of everything.
+
+    Pages are as large as GitHub allows.  Tag 'v0' is the base commit and
+    milestone 1 holds every issue, so the whole repository is in the report.
+    """
+
+    commits_per_page = crn.PAGE_SIZE
+
+    def __init__(self, n):
+        super().__init__(n_tags=0, n_pulls=0, n_issues=0, page_size=crn.PAGE_SIZE)
+        self.commits = [
+            {
+                "sha": f"{i:040x}",
+                "html_url": f"https://github.com/o/r/commit/{i:040x}",
+                "commit": {
+                    "message": f"commit {i}\n\ndetails",
+                    "committer": {"date": timestamp(i)},
+                },
+            }
+            for i in range(n + 1)
+        ]
+        self.tags = [
+            {
+                "name": f"v{i}",
+                "target": {
+                    "oid": c["sha"],
+                    "committedDate": c["commit"]["committer"]["date"],
+                    "url": c["html_url"],
+                },
+            }
+            for i, c in enumerate(self.commits[:n])
+        ]
+        self.pulls = [  # newest first, as requested
+            {
+                "number": i,
+                "title": f"PR {i}",
+                "url": f"https://github.com/o/r/pull/{i}",
+                "closedAt": timestamp(i),
+                "updatedAt": timestamp(i),
+                "merged": bool(i % 2),
+            }
+            for i in range(n, 0, -1)
+        ]
+        self.issues = [
+            {
+                "number": n + i,
+                "title": f"issue {i}",
+                "url": f"https://github.com/o/r/issues/{n + i}",
+                "closedAt": timestamp(i),
+                "updatedAt": timestamp(i),
+                "labels": {"nodes": [{"name": "bug"}]},
+            }
+            for i in range(1, n + 1)
+        ]
+
+    def respond(self, method, url, params, json):
+        if method == "POST":
+            return super().respond(method, url, params, json)
+        # The range is always v0...head, v0 is the first commit.
+        page = int((params or {}).get("page", 1))
+        k = self.commits_per_page
+        body = {
+            "base_commit": self.commits[0],
+            "commits": self.commits[1 + (page - 1) * k : 1 + page * k],
+            "total_commits": len(self.commits) - 1,
+            "status": "ahead",
+        }
+        return FakeResponse(body)
+
+    def graphql(self, query, variables):
+        # Lists are already in the requested order, no need to filter them.
+        cursor = variables.get("cursor")
+        if "homepageUrl" in query:
+            return super().graphql(query, variables)
+        if "pullRequests(" in query:
+            return {"repository": {"pullRequests": self._page(self.pulls, cursor)}}
+        if "milestone(number" in query:
+            issues = self._page(self.issues, cursor)
+            return {"repository": {"milestone": {"issues": issues}}}
+        return super().graphql(query, variables)
+
+
+def fetch(api, jobs):
+    """Phase: fetch the release info (as get_release_info)."""
+    return crn.get_release_info(
+        None,
+        "v0",
+        "main",
+        "v1",
+        api=api,
+        jobs=jobs,
+        milestone_number=1,
+        repository=("o", "r"),
+    )
+
+
+def record(n, path):
+    """Record the responses of synthetic repository 'n' in cassette 'path'."""
+    cassette = crn.Cassette(path, session=SyntheticGitHub(n))
+    fetch(crn.GitHubAPI("token", session=cassette), crn.JOBS)
+    cassette.save()
+
+
+def measure(phase, function, cassette):
+    """Run 'function' twice: timed, then traced.  Return a row of results."""
+    requests = cassette.requests
+    t0 = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - t0
+    requests = cassette.requests - requests
+
+    tracemalloc.start()
+    function()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    row = dict(phase=phase, seconds=seconds, requests=requests, peak_bytes=peak)
+    return result, row
+
+
+def benchmark(n, jobs=crn.JOBS, directory=None):
+    """Return the results of each phase for a synthetic repository of 'n'."""
+    directory = pathlib.Path(directory or tempfile.mkdtemp())
+    path = directory / f"cassette_{n}.json"
+    if not path.exists():
+        record(n, path)
+
+    cassette = crn.Cassette(path)  # replay
+    api = crn.GitHubAPI("token", session=cassette)
+    info, row = measure("fetch", lambda: fetch(api, jobs), cassette)
+    rows = [dict(row, n=n)]
+    with open(os.devnull, "w") as null:
+        for fmt, writer in sorted(crn.REPORT_WRITERS.items()):
+            _, row = measure(
+                f"report {fmt}",
+                lambda: crn.report("v1", *info, writer=writer(null)),
+                cassette,
+            )
+            rows.append(dict(row, n=n))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=SIZES,
+        help=f"number of each item in the synthetic repositories (default={SIZES})",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=crn.JOBS)
+    parser.add_argument("--json", default=None, help="also write results to file")
+    cmd = parser.parse_args()
+
+    directory = pathlib.Path(tempfile.mkdtemp())
+    crn.MILESTONE_INDEX_FILE = directory / "milestones.json"
+    rows = []
+    print(f"{'n':>8} {'phase':<16} {'seconds':>9} {'requests':>9} {'peak MiB':>9}")
+    for n in cmd.sizes:
+        for row in benchmark(n, jobs=max(1, cmd.jobs), directory=directory):
+            print(
+                f"{row['n']:>8} {row['phase']:<16} {row['seconds']:>9.3f}"
+                f" {row['requests']:>9} {row['peak_bytes'] / 2**20:>9.1f}"
+            )
+            rows.append(row)
+    if cmd.json is not None:
+        with open(cmd.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark update_copyright_date with synthetic trees of files.
+
+A synthetic tree has *n* files, 100 to a directory: text files with
+notices to update (one to three each), text files already current,
+text without a notice, scripts and other text without a suffix, and
+binary files.  File sizes vary (log-normal, median about 3 kB).
+
+Each phase is measured separately (walk the tree, classify the files,
+update the text files) and end-to-end, with
+:func:`~murky.update_copyright_date.process_files`: without a cache,
+filling a cache, and with the cache filled.  This reports the wall time,
+files/s, MB/s, the number of read and write system calls of this process
+(from ``/proc/self/io``, where available, not those of ``--jobs``
+processes), and the peak resident memory.
+
+Run from the command line::
+
+    python -m murky.tests.bench_ucd
+    python -m murky.tests.bench_ucd --sizes 1000 1000000 --jobs 4 --json bench.json
+"""
+
+import argparse
+import functools
+import json
+import pathlib
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from .. import update_copyright_date as ucd
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+SIZES = (1_000, 10_000)
+OWNER = "Synthetic Owner"
+FILES_PER_DIRECTORY = 100
+MAX_FILE_SIZE = 2**20
+
+# kind: (suffix, weight)
+KINDS = {
+    "notice": (".py", 30),  # notices to update
+    "current": (".md", 20),  # notices already current
+    "plain": (".txt", 25),  # no notice
+    "script": ("", 5),  # "#!" line
+    "unknown": ("", 5),  # text, libmagic decides
+    "binary": (".png", 15),
+}
+
+
+def make_file(path, kind, size, rng):
+    """Write one synthetic file of about 'size' bytes."""
+    if kind == "binary":
+        path.write_bytes(b"\x89PNG\0" + rng.getrandbits(8 * size).to_bytes(size, "big"))
+        return
+    old = f"(C) 2000-{ucd.LAST_YEAR} {OWNER}"
+    new = f"(C) 2000-{ucd.THIS_YEAR} {OWNER}"
+    filler = "# synthetic line of text, neither notice nor code\n"
+    lines = [filler] * max(1, size // len(filler))
+    if kind in ("notice", "current"):
+        for _ in range(rng.randint(1, 3)):
+            notice = old if kind == "notice" else new
+            lines[rng.randrange(len(lines))] = f"# Copyright {notice}\n"
+    if kind == "script":
+        lines[0] = "#!/bin/sh\n"
+    with open(path, "w", newline="") as f:
+        f.writelines(lines)
+
+
+def make_tree(root, n, seed=0):
+    """Write a tree of 'n' synthetic files in 'root', return the count of each kind."""
+    rng = random.Random(seed)
+    names, weights = list(KINDS), [w for _, w in KINDS.values()]
+    counts = dict.fromkeys(KINDS, 0)
+    for i in range(n):
+        directory = pathlib.Path(root).joinpath(
+            f"d{i // FILES_PER_DIRECTORY**2:04d}",
+            f"d{i // FILES_PER_DIRECTORY % FILES_PER_DIRECTORY:02d}",
+        )
+        if i % FILES_PER_DIRECTORY == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        kind = rng.choices(names, weights)[0]
+        size = min(int(rng.lognormvariate(8, 1.5)), MAX_FILE_SIZE)
+        make_file(directory / f"f{i}{KINDS[kind][0]}", kind, size, rng)
+        counts[kind] += 1
+    return counts
+
+
+def io_counters():
+    """Return (read, write) system call counts of this process, or None."""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(fields["syscr"]), int(fields["syscw"])
+
+
+def peak_rss():
+    """Peak resident memory (bytes) of this process and its children, or None."""
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024  # bytes or kB
+    return scale * max(
+        resource.getrusage(who).ru_maxrss
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    )
+
+
+def measure(phase, function, files, size):
+    """Run 'function' once.  Return its result and a row of results."""
+    io = io_counters()
+    t0 = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - t0
+    syscalls = None
+    if io is not None:
+        syscalls = sum(io_counters()) - sum(io)
+    row = dict(
+        phase=phase,
+        files=files,
+        seconds=seconds,
+        files_per_s=files / seconds,
+        mb_per_s=size / seconds / 1e6,
+        syscalls=syscalls,  # read and write, includes the benchmark's own
+        peak_rss=peak_rss(),
+    )
+    return result, row
+
+
+def benchmark(n, jobs=1, directory=None):
+    """Return the results of each phase for a synthetic tree of 'n' files."""
+    directory = pathlib.Path(directory or tempfile.mkdtemp())
+    tree = directory / f"tree_{n}"
+    shutil.rmtree(tree, ignore_errors=True)
+    make_tree(tree, n)
+    size = sum(f.stat().st_size for f in ucd.find_source_files(tree))
+    ucd._classify.cache_clear()  # classify each file, as in a new process
+
+    rows = []
+
+    def phase(name, function, files, size):
+        result, row = measure(name, function, files, size)
+        rows.append(dict(row, n=n))
+        return result
+
+    files = phase("walk", lambda: list(ucd.find_source_files(tree)), n, size)
+    text = phase("classify", lambda: ucd.sift_file_list(files), n, size)
+    text_size = sum(f.stat().st_size for f in text)
+
+    def update():
+        for fn in text:
+            ucd.update(fn, OWNER)
+
+    phase("update", update, len(text), text_size)
+
+    # End-to-end, from a new tree: walk, classify, update; without a
+    # cache, then filling a cache, then with the cache filled.
+    cache = ucd.FileCache(directory / f"cache_{n}.sqlite")
+    cache.db.execute("DELETE FROM files")
+    for name, cached in [("end-to-end", None), ("end-to-end, new cache", cache)]:
+        shutil.rmtree(tree)
+        make_tree(tree, n)
+        ucd._classify.cache_clear()
+        process = functools.partial(
+            ucd.process_files,
+            ucd.find_source_files(tree),
+            OWNER,
+            jobs=jobs,
+            cache=cached,
+        )
+        phase(name, process, n, size)
+    process = functools.partial(
+        ucd.process_files, ucd.find_source_files(tree), OWNER, jobs=jobs, cache=cache
+    )
+    phase("end-to-end, cached", process, n, size)
+    cache.close()
+    shutil.rmtree(tree)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=SIZES,
+        help=f"number of files in the synthetic trees (default={SIZES})",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--json", default=None, help="also write results to file")
+    cmd = parser.parse_args()
+
+    directory = pathlib.Path(tempfile.mkdtemp())
+    rows = []
+    print(
+        f"{'n':>8} {'phase':<22} {'seconds':>9} {'files/s':>10}"
+        f" {'MB/s':>8} {'syscalls':>10} {'RSS MiB':>8}"
+    )
+    for n in cmd.sizes:
+        for row in benchmark(n, jobs=max(1, cmd.jobs), directory=directory):
+            print(
+                f"{row['n']:>8} {row['phase']:<22} {row['seconds']:>9.3f}"
+                f" {row['files_per_s']:>10.0f} {row['mb_per_s']:>8.1f}"
+                f" {row['syscalls'] or '-':>10}"
+                f" {(row['peak_rss'] or 0) / 2**20:>8.1f}"
+            )
+            rows.append(row)
+    shutil.rmtree(directory)
+    if cmd.json is not None:
+        with open(cmd.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Test the batch_release_notes module."""
+
+import json
+import pathlib
+import sys
+import tempfile
+
+import pytest
+
+from .. import batch_release_notes as brn
+from .. import create_release_notes as crn
+from .test_crn import FakeGitHub
+from .test_crn import make_config_file
+
+MANIFEST = """
+defaults:
+  head: main
+  base: v0
+releases:
+  - repository: o/r
+    milestone: v1
+  - path: clone
+    milestone: v2
+    milestone_number: 2
+    output: reports/r-v2.json
+  - repository: o/r
+    milestone: v99
+"""
+
+
+@pytest.fixture(scope="function")
+def manifest(monkeypatch):
+    path = pathlib.Path(tempfile.mkdtemp())
+    monkeypatch.setattr(crn, "MILESTONE_INDEX_FILE", path / "milestones.json")
+    (path / "clone").mkdir()
+    make_config_file(path / "clone", "o", "r")
+    (path / "releases.yml").write_text(MANIFEST)
+    yield path / "releases.yml"
+
+
+def test_read_manifest(manifest, monkeypatch):
+    releases = brn.read_manifest(manifest)
+    assert len(releases) == 3
+    assert releases[0] == brn.Release(("o", "r"), "v0", "v1", head="main")
+    assert releases[1].repository == ("o", "r")  # from the clone
+    assert releases[1].milestone_number == 2
+    assert releases[0].output_file("out") == pathlib.Path("out/o_r_v1.md")
+
+    toml = manifest.with_suffix(".toml")
+    toml.write_text(
+        '[[releases]]\nrepository = "o/r"\nbase = "v0"\nmilestone = "2.10"\n'
+    )
+    assert brn.read_manifest(toml) == [brn.Release(("o", "r"), "v0", "2.10")]
+    with monkeypatch.context() as m:  # as before Python 3.11, without tomli
+        m.setitem(sys.modules, "tomllib", None)
+        m.setitem(sys.modules, "tomli", None)
+        with pytest.raises(ImportError, match="tomli"):
+            brn.read_manifest(toml)
+
+    manifest.write_text("releases:\n  - repository: o/r\n    milestone: v1\n")
+    with pytest.raises(ValueError):
+        brn.read_manifest(manifest)  # no base
+
+    # An unquoted number would be read as 2.1, not 2.10.
+    manifest.write_text("releases:\n  - {repository: o/r, base: v0, milestone: 2.10}\n")
+    with pytest.raises(ValueError, match="quote"):
+        brn.read_manifest(manifest)
+    toml.write_text('[[releases]]\nrepository = "o/r"\nbase = "v0"\nmilestone = 2.10\n')
+    with pytest.raises(ValueError, match="quote"):
+        brn.read_manifest(toml)
+
+
+def test_batch_release_notes(manifest):
+    session = FakeGitHub()
+    api = crn.GitHubAPI("token", session=session)
+    releases = brn.read_manifest(manifest)
+    results = brn.batch_release_notes(
+        releases, api, directory=manifest.parent, parallel=3, jobs=2
+    )
+
+    assert results[releases[0]] == manifest.parent / "o_r_v1.md"
+    assert "[#106](https://github.com/o/r/pull/106)" in results[releases[0]].read_text()
+
+    notes = json.loads((manifest.parent / "reports" / "r-v2.json").read_text())
+    assert notes["milestone"]["text"] == "v2"
+
+    # One failure does not stop the others.
+    assert isinstance(results[releases[2]], ValueError)
@@ -1,12 +1,19 @@
 """Test the create_release_notes module."""
 
+import concurrent.futures
+import datetime
+import io
+import json
 import os
 import pathlib
 import tempfile
+import time
+from contextlib import redirect_stdout
 
 import pytest
 
 from .. import create_release_notes as crn
+from .test_local_git import make_git_repo
 
 
 @pytest.fixture(scope="function")
@@ -69,3 +76,625 @@ def test_getRepositoryInfo(tmp_path):
 
     info = crn.getRepositoryInfo(config_path)
     assert info == (org, repo)
+
+
+class FakeResponse:
+    """Just enough of requests.Response for crn.GitHubAPI."""
+
+    def __init__(self, body, status_code=200, links=None, headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.links = links or {}
+        self.headers = headers or {}
+        self.text = json.dumps(body)
+        self.content = self.text.encode()
+
+    def json(self):
+        return self.body
+
+
+class FakeGitHub:
+    """
+    Stand-in for requests.Session, serves a tiny synthetic repository.
+
+    Pages hold 'page_size' items so pagination is exercised.
+    """
+
+    commits_per_page = 3  # of the REST compare endpoint
+
+    def __init__(self, n_tags=5, n_pulls=7, n_issues=4, page_size=2):
+        self.headers = {}
+        self.calls = []
+        self.page_size = page_size
+        day = "2024-01-%02dT12:00:00Z"
+        self.commits = [
+            {
+                "sha": f"{i:040x}",
+                "html_url": f"https://github.com/o/r/commit/{i:040x}",
+                "commit": {
+                    "message": f"commit {i}\n\ndetails",
+                    "committer": {"date": day % (i + 1)},
+                },
+            }
+            for i in range(10)
+        ]
+        self.milestones = [
+            {
+                "number": n,
+                "title": f"v{n}",
+                "url": f"https://github.com/o/r/milestone/{n}",
+            }
+            for n in (1, 2, 11)
+        ]
+        self.tags = [
+            {
+                "name": f"v{i}",
+                "target": {
+                    "oid": self.commits[2 * i]["sha"],
+                    "committedDate": day % (2 * i + 1),
+                    "url": self.commits[2 * i]["html_url"],
+                },
+            }
+            for i in range(n_tags)
+        ]
+        self.pulls = [
+            {
+                "number": 100 + i,
+                "title": f"PR {i}",
+                "url": f"https://github.com/o/r/pull/{100 + i}",
+                "closedAt": day % (i + 1),
+                "updatedAt": day % (i + 1),
+                "merged": bool(i % 2),
+            }
+            for i in range(n_pulls)
+        ]
+        self.issues = [
+            {
+                "number": 200 + i,
+                "title": f"issue {i}",
+                "url": f"https://github.com/o/r/issues/{200 + i}",
+                "closedAt": day % (i + 2),
+                "updatedAt": day % (i + 2),
+                "labels": {"nodes": [{"name": "bug"}]},
+            }
+            for i in range(n_issues)
+        ]
+
+    @staticmethod
+    def pull_state(pull):
+        if pull["closedAt"] is None:
+            return "OPEN"
+        return "MERGED" if pull["merged"] else "CLOSED"
+
+    def _page(self, items, cursor):
+        start = int(cursor or 0)
+        end = start + self.page_size
+        return {
+            "pageInfo": {"hasNextPage": end < len(items), "endCursor": str(end)},
+            "nodes": items[start:end],
+        }
+
+    def request(self, method, url, params=None, json=None, headers=None, **kwargs):
+        response = self.respond(method, url, params, json)
+        if method == "GET":  # GraphQL (POST) replies have no validators
+            etag = f'"{hash(response.text)}"'
+            response.headers["ETag"] = etag
+            if (headers or {}).get("If-None-Match") == etag:
+                response = FakeResponse(None, status_code=304)
+        self.calls.append((method, url, response.status_code))
+        return response
+
+    def respond(self, method, url, params, json):
+        if method == "POST":
+            return FakeResponse(
+                {"data": self.graphql(json["query"], json["variables"])}
+            )
+        # REST compare: the base commit and a page of commits
+        base = url.split("/compare/")[-1].split("...")[0]
+        shas = [c["sha"] for c in self.commits]
+        if base in shas:
+            start = shas.index(base)
+        else:
+            start = shas.index(
+                [t for t in self.tags if t["name"] == base][0]["target"]["oid"]
+            )
+        in_range = self.commits[start + 1 :]
+        page = int((params or {}).get("page", 1))
+        n = self.commits_per_page
+        body = {
+            "base_commit": self.commits[start],
+            "commits": in_range[(page - 1) * n : page * n],
+            "total_commits": len(in_range),
+            "status": "ahead" if in_range else "identical",
+        }
+        return FakeResponse(body)
+
+    def graphql(self, query, variables):
+        cursor = variables.get("cursor")
+        repository = {}
+        if "homepageUrl" in query:
+            repository.update(
+                url="https://github.com/o/r",
+                homepageUrl="https://o.github.io/r",
+                latestRelease={"url": "https://github.com/o/r/releases/tag/v0"},
+            )
+            if "milestones(" in query:
+                milestones = [
+                    m for m in self.milestones if variables["title"] in m["title"]
+                ]
+                repository["milestones"] = self._page(milestones, cursor)
+            else:
+                repository["milestone"] = next(
+                    (m for m in self.milestones if m["number"] == variables["number"]),
+                    None,
+                )
+        elif "refs(" in query:
+            repository["refs"] = self._page(self.tags, cursor)
+        elif "pullRequests(" in query:
+            states = variables.get("states") or ["OPEN", "CLOSED", "MERGED"]
+            pulls = [p for p in self.pulls if self.pull_state(p) in states]
+            if "UPDATED_AT, direction: DESC" in query:
+                pulls = sorted(pulls, key=lambda p: p["updatedAt"], reverse=True)
+            repository["pullRequests"] = self._page(pulls, cursor)
+        elif "milestone(number" in query:
+            states = variables.get("states") or ["CLOSED"]
+            issues = [
+                i
+                for i in self.issues
+                if ("CLOSED" if i["closedAt"] else "OPEN") in states
+                and (
+                    variables.get("since") is None
+                    or crn.parse_timestamp(i["updatedAt"])
+                    > crn.parse_timestamp(variables["since"])
+                )
+            ]
+            repository["milestone"] = {"issues": self._page(issues, cursor)}
+        return {"repository": repository}
+
+
+@pytest.fixture(scope="function")
+def fake_clone(tmp_path, monkeypatch):
+    monkeypatch.setattr(crn, "MILESTONE_INDEX_FILE", tmp_path / "milestones.json")
+    make_config_file(tmp_path, "o", "r")
+    owd = pathlib.Path.cwd()
+    os.chdir(str(tmp_path))
+    yield tmp_path
+    os.chdir(owd)
+
+
+def test_get_release_info(fake_clone):
+    session = FakeGitHub()
+    api = crn.GitHubAPI("token", session=session)
+    repo, milestone, tags, pulls, issues, commits = crn.get_release_info(
+        "token", "v0", "main", "v1", api=api
+    )
+    assert milestone.number == 1
+    assert repo.homepage == "https://o.github.io/r"
+    assert len(commits) == 9
+    # v0 is the base commit, outside of the range
+    assert sorted(tags) == ["v1", "v2", "v3", "v4"]
+    # PR closed at the same time as the base commit is excluded
+    assert sorted(pulls) == list(range(101, 107))
+    assert sorted(issues) == [200, 201, 202, 203]
+    # compact records, only what the report needs
+    assert isinstance(pulls[101], crn.PullRecord)
+    assert not hasattr(pulls[101], "__dict__")
+    assert issues[200].labels == ("bug",)
+    assert next(iter(commits.values())).subject == "commit 1"
+    # Requests scale with pages, not with the number of tags.
+    assert len(session.calls) == 13
+
+    buf = io.StringIO()
+    with redirect_stdout(buf):
+        crn.report("v1", repo, milestone, tags, pulls, issues, commits)
+    text = buf.getvalue()
+    assert len(session.calls) == 13  # report makes no requests
+    assert "[v4](https://github.com/o/r/releases/tag/v4) | 2024-01-09" in text
+    assert (
+        "[#101](https://github.com/o/r/pull/101) | 2024-01-02 | merged | PR 1" in text
+    )
+    assert "[Commits](#commits) | 9" in text
+
+
+def test_ResponseCache(fake_clone):
+    cache_file = fake_clone / "cache.sqlite"
+    session = FakeGitHub()
+
+    def run(**kwargs):
+        session.calls.clear()
+        cache = crn.ResponseCache(cache_file, **kwargs)
+        api = crn.GitHubAPI("token", session=session, cache=cache)
+        return crn.get_release_info("token", "v0", "main", "v1", api=api)
+
+    first = run()
+    assert len(session.calls) == 13
+    assert all(status == 200 for *_, status in session.calls)
+
+    # The milestone is now requested by its number (from the index).
+    assert run() == first
+    assert len(session.calls) == 1
+
+    # Fresh entries: no requests at all.
+    assert run() == first
+    assert session.calls == []
+
+    # Expired entries: REST ones are revalidated ('304 Not Modified'),
+    # GraphQL ones (without validators) are fetched again.
+    assert run(ttl=0) == first
+    assert len(session.calls) == 13
+    assert {status for method, _, status in session.calls if method == "GET"} == {304}
+    assert {status for method, _, status in session.calls if method == "POST"} == {200}
+
+    # Another token does not share the cached responses.
+    session.calls.clear()
+    api = crn.GitHubAPI("other", session=session, cache=crn.ResponseCache(cache_file))
+    assert crn.get_release_info("other", "v0", "main", "v1", api=api) == first
+    assert len(session.calls) == 13
+    assert all(status == 200 for *_, status in session.calls)
+
+    run(refresh=True)
+    assert len(session.calls) == 13
+
+    # Size-based eviction keeps the database bounded.
+    cache = crn.ResponseCache(cache_file, max_bytes=0)
+    assert cache.db.execute("SELECT COUNT(*) FROM responses").fetchone() == (0,)
+
+
+def test_fetch_pulls_stops_at_earliest(fake_clone):
+    session = FakeGitHub(n_pulls=7)
+    # A long history of pull requests closed before the base tag.
+    session.pulls += [
+        {
+            "number": i,
+            "title": f"old PR {i}",
+            "url": f"https://github.com/o/r/pull/{i}",
+            "closedAt": "2023-06-01T00:00:00Z",
+            "updatedAt": "2023-06-01T00:00:00Z",
+            "merged": True,
+        }
+        for i in range(1, 50)
+    ]
+    api = crn.GitHubAPI("token", session=session)
+    earliest = crn.parse_timestamp("2024-01-01T12:00:00Z")
+    pulls = crn.fetch_pulls(api, "o", "r", earliest)
+    assert sorted(pulls) == list(range(101, 107))
+    # 6 matches + 1 at the boundary, 2 per page: 4 pages of 28
+    assert len(session.calls) == 4
+
+
+def test_get_release_info_concurrent(fake_clone):
+    session = FakeGitHub()
+    api = crn.GitHubAPI("token", session=session)
+    serial = crn.get_release_info("token", "v0", "main", "v1", api=api, jobs=1)
+    n_calls = len(session.calls)
+    session.calls.clear()
+    parallel = crn.get_release_info("token", "v0", "main", "v1", api=api, jobs=4)
+    assert parallel == serial
+    assert len(session.calls) == n_calls
+    assert list(parallel[-1]) == list(serial[-1])  # commits stay in order
+
+
+def test_RateLimiter():
+    naps = []
+    limiter = crn.RateLimiter(reserve=1, sleep=naps.append)
+
+    response = FakeResponse({}, headers={"X-RateLimit-Remaining": "4000"})
+    assert not limiter.update(response)
+    limiter.wait()
+    assert naps == []
+
+    # budget exhausted: wait for the reset, then continue
+    reset = time.time() + 60
+    headers = {"X-RateLimit-Remaining": "1", "X-RateLimit-Reset": str(reset)}
+    assert not limiter.update(FakeResponse({}, headers=headers))
+    limiter.wait()
+    assert len(naps) == 1
+    assert 55 < naps[0] <= 61
+
+    # rejected with advice: retry after waiting
+    limiter = crn.RateLimiter(sleep=naps.append)
+    rejected = FakeResponse({}, status_code=403, headers={"Retry-After": "30"})
+    assert limiter.update(rejected)
+    assert not limiter.update(rejected, attempt=crn.RATE_LIMIT_RETRIES)
+    limiter.wait()
+    assert 25 < naps[-1] <= 30
+
+
+def test_GitHubAPI_retries_rate_limited_request():
+    class Throttled(FakeGitHub):
+        rejections = 2
+
+        def respond(self, method, url, params, json):
+            if self.rejections > 0:
+                self.rejections -= 1
+                return FakeResponse({}, status_code=429, headers={"Retry-After": "0"})
+            return super().respond(method, url, params, json)
+
+    session = Throttled()
+    api = crn.GitHubAPI("token", session=session)
+    assert api.get("repos/o/r/compare/v0...main")["total_commits"] == 9
+    assert [status for *_, status in session.calls] == [429, 429, 200]
+
+
+def test_get_release_info_incremental(fake_clone, monkeypatch):
+    monkeypatch.setattr(crn, "SNAPSHOT_DIR", fake_clone / "snapshots")
+    session = FakeGitHub()
+    api = crn.GitHubAPI("token", session=session)
+
+    def run(function):
+        session.calls.clear()
+        return function("token", "v0", "main", "v1", api=api)
+
+    first = run(crn.get_release_info_incremental)
+    assert first == run(crn.get_release_info)
+    assert len(list((fake_clone / "snapshots").iterdir())) == 1
+
+    # Changes since the first run: a new commit, a merged PR, issues
+    # closed and reopened.
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    session.commits.append(
+        {
+            "sha": "f" * 40,
+            "html_url": "https://github.com/o/r/commit/" + "f" * 40,
+            "commit": {"message": "new", "committer": {"date": now}},
+        }
+    )
+    session.pulls.append(
+        dict(
+            number=300,
+            title="new PR",
+            url="u",
+            closedAt=now,
+            updatedAt=now,
+            merged=True,
+        )
+    )
+    session.pulls[4].update(closedAt=None, updatedAt=now)  # reopened
+    session.issues[0].update(closedAt=None, updatedAt=now)  # reopened
+    session.issues.append(
+        dict(
+            number=301,
+            title="new",
+            url="u",
+            closedAt=now,
+            updatedAt=now,
+            labels={"nodes": []},
+        )
+    )
+
+    updated = run(crn.get_release_info_incremental)
+    assert len(session.calls) < 13
+    full = run(crn.get_release_info)
+    assert updated == full
+    assert 300 in updated[3]
+    assert 104 in first[3] and 104 not in updated[3]
+    assert sorted(updated[4]) == [201, 202, 203, 301]
+    assert "f" * 40 in updated[5]
+
+
+def test_get_release_info_incremental_cached(fake_clone, monkeypatch):
+    monkeypatch.setattr(crn, "SNAPSHOT_DIR", fake_clone / "snapshots")
+    session = FakeGitHub()
+    cache = crn.ResponseCache(fake_clone / "cache.sqlite")
+    api = crn.GitHubAPI("token", session=session, cache=cache)
+
+    def run():
+        return crn.get_release_info_incremental("token", "v0", "main", "v1", api=api)
+
+    run()
+    # Merged within the cache's time-to-live, after the first run.
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    session.pulls.append(
+        dict(number=300, title="new", url="u", closedAt=now, updatedAt=now, merged=True)
+    )
+    assert 300 in run()[3]
+    assert 300 in run()[3]
+    assert not api.revalidate  # the caller's client is unchanged
+
+
+def test_local_commits_and_tags(monkeypatch):
+    repo = make_git_repo(pathlib.Path(tempfile.mkdtemp()))
+    monkeypatch.chdir(repo)
+    monkeypatch.setattr(crn, "MILESTONE_INDEX_FILE", repo / "milestones.json")
+
+    commits, base_date, status = crn.fetch_local_commits("o", "r", "v0", "HEAD")
+    assert status == "ahead"
+    assert base_date == crn.parse_timestamp("2024-01-01T12:00:00Z")
+    assert len(commits) == 4
+    sha, commit = list(commits.items())[-1]  # newest last, as from the API
+    assert commit.date == "2024-01-05T12:00:00Z"
+    assert commit.url == f"https://github.com/o/r/commit/{sha}"
+
+    with pytest.raises(ValueError):
+        crn.fetch_local_commits("o", "r", "v0", "no-such-branch")
+
+    tags = crn.fetch_local_tags("o", "r")
+    assert sorted(tags) == ["v0", "v1", "v3"]
+    assert tags["v3"].url == "https://github.com/o/r/releases/tag/v3"
+
+    # Pull requests and issues still come from the (fake) API.
+    session = FakeGitHub()
+    api = crn.GitHubAPI("token", session=session)
+    info = crn.get_release_info("token", "v0", "HEAD", "v1", api=api, local=True)
+    assert info[-1] == commits
+    assert sorted(info[2]) == ["v1", "v3"]
+    assert len(session.calls) == 1 + 4 + 2  # repository, pulls, issues
+
+
+@pytest.mark.parametrize("fmt", ["markdown", "json", "html"])
+def test_write_release_notes(fake_clone, fmt):
+    api = crn.GitHubAPI("token", session=FakeGitHub())
+    buf = io.StringIO()
+    writer = crn.REPORT_WRITERS[fmt](buf)
+    crn.write_release_notes("token", "v0", "main", "v1", writer=writer, api=api)
+    text = buf.getvalue()
+    if fmt == "json":
+        notes = json.loads(text)
+        assert notes["summary"] == dict(
+            new_tags=4, pull_requests=6, issues=4, commits=9
+        )
+        assert notes["pull_requests"][0]["pull_request"] == "#106"
+        assert notes["tags"][0]["tag_url"].endswith("/releases/tag/v4")
+    elif fmt == "html":
+        assert text.startswith("<!DOCTYPE html>")
+        assert '<a href="https://github.com/o/r/pull/106">#106</a>' in text
+        # every summary link has its section
+        for anchor in ("tags", "pull-requests", "issues", "commits"):
+            assert f'<a href="#{anchor}">' in text
+            assert f"<h3 id='{anchor}'>" in text
+    else:
+        assert "[#106](https://github.com/o/r/pull/106)" in text
+        assert text.index("[Commits](#commits) | 9") < text.index("### Tags")
+
+
+def test_report_streams_sections(fake_clone):
+    """Sections are written before later collections are resolved."""
+    api = crn.GitHubAPI("token", session=FakeGitHub())
+    repo, milestone, tags, pulls, issues, commits = crn.get_release_info(
+        "token", "v0", "main", "v1", api=api
+    )
+    buf = io.StringIO()
+    written = []
+
+    def when_needed(result):
+        written.append(buf.getvalue())
+        return result
+
+    future = crn.concurrent.futures.Future()
+    future.set_result(issues)
+    deferred = crn.Deferred(future, when_needed)
+    writer = crn.JSONWriter(buf)
+    crn.report("v1", repo, milestone, tags, pulls, deferred, commits, writer=writer)
+    assert '"pull_requests": [' in written[0]
+    assert '"issues": [' not in written[0]
+    assert json.loads(buf.getvalue())["summary"]["issues"] == 4
+
+
+def test_report_format():
+    assert crn.report_format() == "markdown"
+    assert crn.report_format("notes.JSON") == "json"
+    assert crn.report_format("notes.html") == "html"
+    assert crn.report_format("notes.html", "markdown") == "markdown"
+
+
+def test_MilestoneIndex(fake_clone):
+    session = FakeGitHub()
+    api = crn.GitHubAPI("token", session=session)
+
+    # not indexed: list the milestones matching the title, index them
+    repo, milestone = crn.fetch_repository(api, "o", "r", "v1")
+    assert milestone.number == 1
+    assert crn.MilestoneIndex().get("o", "r", "v11") == 11
+    assert len(session.calls) == 1
+
+    # indexed: one request by number
+    session.calls.clear()
+    assert crn.fetch_repository(api, "o", "r", "v11")[1].number == 11
+    assert len(session.calls) == 1
+
+    # stale index (milestone renamed): refreshed
+    session.milestones[0]["title"] = "v1.0"
+    session.calls.clear()
+    assert crn.fetch_repository(api, "o", "r", "v1.0")[1].number == 1
+    assert crn.MilestoneIndex().get("o", "r", "v1.0") == 1
+
+    # given by number, no lookup
+    session.calls.clear()
+    repo, milestone = crn.fetch_repository(
+        api, "o", "r", "anything", milestone_number=2
+    )
+    assert milestone.title == "v2"
+    assert len(session.calls) == 1
+
+    assert crn.fetch_repository(api, "o", "r", "v99")[1] is None
+
+
+def test_MilestoneIndex_concurrent(fake_clone):
+    path = crn.MILESTONE_INDEX_FILE
+    path.write_text("{not json")  # e.g. left by an older version
+    assert crn.MilestoneIndex().index == {}
+
+    def update(i):
+        crn.MilestoneIndex().update("o", f"r{i % 4}", {f"v{i}": i})
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(update, range(64)))
+    index = crn.MilestoneIndex()
+    assert all(index.get("o", f"r{i % 4}", f"v{i}") == i for i in range(64))
+    assert [p.name for p in path.parent.iterdir() if "milestones" in p.name] == [
+        path.name
+    ]
+
+
+def test_Cassette(fake_clone):
+    path = fake_clone / "cassette.json.gz"
+    cassette = crn.Cassette(path, session=FakeGitHub())
+    api = crn.GitHubAPI("token", session=cassette)
+    recorded = crn.get_release_info("token", "v0", "main", "v1", api=api)
+    cassette.save()
+    assert cassette.requests == len(cassette.session.calls)
+
+    # Replay: same results, no network.  (Start from the same milestone
+    # index, or the milestone is requested by number, not recorded.)
+    crn.MILESTONE_INDEX_FILE.unlink()
+    replay = crn.Cassette(path)
+    api = crn.GitHubAPI("token", session=replay)
+    assert crn.get_release_info("token", "v0", "main", "v1", api=api) == recorded
+    assert replay.requests == cassette.requests
+
+    with pytest.raises(crn.GitHubAPIError):
+        crn.get_release_info("token", "v1", "main", "v1", api=api)
+
+
+def test_benchmark(fake_clone):
+    from .bench_crn import benchmark
+
+    rows = benchmark(100, jobs=2, directory=fake_clone)
+    assert [row["phase"] for row in rows] == [
+        "fetch",
+        "report html",
+        "report json",
+        "report markdown",
+    ]
+    assert rows[0]["requests"] == 5
+    assert all(row["seconds"] > 0 and row["peak_bytes"] > 0 for row in rows)
+
+
+def test_Profiler(fake_clone, capsys):
+    session = FakeGitHub()
+    profiler = crn.Profiler()
+    api = crn.GitHubAPI("token", session=session, profiler=profiler)
+    writer = crn.MarkdownWriter(io.StringIO())
+    crn.write_release_notes("token", "v0", "main", "v1", writer=writer, api=api)
+
+    summary = profiler.summary()
+    phases = summary["phases"]
+    assert sum(p["requests"] for p in phases.values()) == len(session.calls)
+    assert phases["commits"]["requests"] == 3  # pages of the compare endpoint
+    assert phases["tags"]["requests"] == 3
+    assert phases["pulls"]["network"] == phases["pulls"]["requests"] > 0
+    assert phases["issues"]["bytes"] > 0
+    assert "other" not in phases
+    assert sum(phases["tags"]["latency_ms"]["histogram"].values()) == 3
+    assert "report: Commits" in phases
+
+    profiler.write("-")
+    assert "rate limit" not in capsys.readouterr().err  # no such headers
+
+    path = fake_clone / "profile.json"
+    profiler.write(path)
+    profile = json.loads(path.read_text())
+    assert profile["summary"]["phases"].keys() == phases.keys()
+    events = profile["traceEvents"]
+    assert {e["cat"] for e in events} == {"phase", "request"}
+    assert len([e for e in events if e["cat"] == "request"]) == len(session.calls)
+
+    # Rate limit budget, from the response headers.
+    response = FakeResponse({})
+    response.headers.update({"X-RateLimit-Limit": "5000"})
+    for remaining in ("4990", "4980"):
+        response.headers["X-RateLimit-Remaining"] = remaining
+        profiler.record("GET", "url", response, "network", time.perf_counter())
+    assert profiler.summary()["rate_limit"]["core"] == dict(
+        limit=5000, remaining=4980, consumed=10
+    )
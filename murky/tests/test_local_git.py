@@ -0,0 +1,135 @@
+"""Test the local_git module."""
+
+import os
+import pathlib
+import subprocess
+import tempfile
+
+import pytest
+
+from .. import local_git
+
+
+def git(repo, *args, date="2024-01-01T12:00:00Z"):
+    env = dict(
+        os.environ,
+        GIT_AUTHOR_NAME="Unit Test",
+        GIT_AUTHOR_EMAIL="unit@test",
+        GIT_COMMITTER_NAME="Unit Test",
+        GIT_COMMITTER_EMAIL="unit@test",
+        GIT_AUTHOR_DATE=date,
+        GIT_COMMITTER_DATE=date,
+    )
+    return subprocess.run(
+        ["git", *args],
+        cwd=repo,
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def make_git_repo(root_path, n_commits=5, org="o", repo="r"):
+    """
+    Repository with one commit per day in January 2024, the first tagged 'v0'.
+
+    Odd-numbered commits are also tagged (annotated tags), 'v1', 'v3', ...
+    """
+    git(root_path, "init", "-q")
+    git(root_path, "remote", "add", "origin", f"git@github.com:{org}/{repo}.git")
+    for i in range(n_commits):
+        date = f"2024-01-{i + 1:02d}T12:00:00Z"
+        (root_path / "file.txt").write_text(f"{i}\n")
+        git(root_path, "add", "file.txt", date=date)
+        git(root_path, "commit", "-q", "-m", f"commit {i}\n\ndetails", date=date)
+        if i == 0:
+            git(root_path, "tag", "v0", date=date)
+        elif i % 2:
+            git(root_path, "tag", "-a", f"v{i}", "-m", f"release {i}", date=date)
+    return root_path
+
+
+@pytest.fixture(scope="function")
+def git_repo():
+    yield make_git_repo(pathlib.Path(tempfile.mkdtemp()))
+
+
+def test_iter_commits(git_repo):
+    commits = list(local_git.iter_commits("v0", "HEAD", cwd=git_repo))
+    assert len(commits) == 4
+    sha, date, message = commits[0]  # oldest first
+    assert len(sha) == 40
+    assert date == "2024-01-02T12:00:00Z"
+    assert message.splitlines()[0] == "commit 1"
+    assert commits[-1][0] == git(git_repo, "rev-parse", "HEAD")
+
+
+def test_resolve_commit(git_repo):
+    head = git(git_repo, "rev-parse", "HEAD")
+    # annotated tag resolves to its commit
+    assert local_git.resolve_commit("v3", cwd=git_repo) == git(
+        git_repo, "rev-parse", "HEAD~1"
+    )
+    assert local_git.resolve_commit("HEAD", cwd=git_repo) == head
+    assert local_git.resolve_commit("no-such-branch", cwd=git_repo) is None
+
+    assert local_git.commit_date("v0", cwd=git_repo) == "2024-01-01T12:00:00Z"
+    assert local_git.is_ancestor("v0", "HEAD", cwd=git_repo)
+    assert not local_git.is_ancestor("HEAD", "v0", cwd=git_repo)
+    assert not local_git.is_shallow(cwd=git_repo)
+
+    # An explicit time: git reads a date alone at the current time of day.
+    assert local_git.commit_before("2024-01-03 00:00:00 +0000", cwd=git_repo) == git(
+        git_repo, "rev-parse", "HEAD~3"
+    )
+    assert local_git.commit_before("2024-01-03 12:00:00 +0000", cwd=git_repo) == git(
+        git_repo, "rev-parse", "HEAD~2"
+    )
+    assert local_git.commit_before("2024-01-01 00:00:00 +0000", cwd=git_repo) is None
+
+
+def test_iter_changed_files(git_repo):
+    (git_repo / "sub").mkdir()
+    (git_repo / "sub" / "a.txt").write_text("a\n")
+    (git_repo / "sub" / "b.txt").write_text("b\n")
+    git(git_repo, "add", "sub")
+    git(git_repo, "commit", "-q", "-m", "sub")
+    assert list(local_git.iter_changed_files("HEAD", cwd=git_repo)) == []
+    assert list(local_git.iter_changed_files("v3", cwd=git_repo)) == [
+        "file.txt",
+        "sub/a.txt",
+        "sub/b.txt",
+    ]
+
+    # uncommitted: modified, deleted, untracked
+    (git_repo / "sub" / "a.txt").write_text("A\n")
+    (git_repo / "sub" / "b.txt").unlink()
+    (git_repo / "sub" / "c.txt").write_text("c\n")
+    changed = local_git.iter_changed_files("HEAD", cwd=git_repo / "sub")
+    assert list(changed) == ["a.txt"]
+    changed = local_git.iter_changed_files("HEAD", cwd=git_repo, untracked=True)
+    assert list(changed) == ["sub/a.txt", "sub/c.txt"]
+
+
+def test_git_error(git_repo):
+    with pytest.raises(local_git.GitError):
+        local_git.git("rev-parse", "--verify", "no-such-ref", cwd=git_repo)
+    with pytest.raises(local_git.GitError):
+        list(local_git.iter_commits("v0", "no-such-ref", cwd=git_repo))
+
+
+def test_tag_index(git_repo):
+    index = local_git.tag_index(cwd=git_repo)
+    assert sorted(index) == ["v0", "v1", "v3"]
+    assert index["v0"]["tagger_date"] is None  # lightweight
+    assert index["v3"]["tagger_date"] == "2024-01-04T12:00:00Z"
+    assert index["v3"]["date"] == "2024-01-04T12:00:00Z"
+    assert index["v3"]["sha"] == git(git_repo, "rev-parse", "v3^{commit}")
+
+    # Same index from packed-refs (with peeled annotated tags).
+    git(git_repo, "pack-refs", "--all")
+    assert not (git_repo / ".git" / "refs" / "tags" / "v3").exists()
+    refs = local_git.read_tag_refs(git_repo / ".git")
+    assert refs["v3"][1] == index["v3"]["sha"]
+    assert local_git.tag_index(cwd=git_repo) == index
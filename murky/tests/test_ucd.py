@@ -2,13 +2,18 @@
 Test the update_copyright_date module.
 """
 
+import io
+import json
+import os
 import pathlib
+import subprocess
 import sys
 import tempfile
 
 import pytest
 
 from .. import update_copyright_date as ucd
+from .test_local_git import make_git_repo
 
 # import datetime
 # import shutil
@@ -147,9 +152,17 @@ def test_find_years_indices(line, symbol, owner, expected, year_string, final):
     result = ucd.revise_copyright_line(line, symbol, owner, ucd.THIS_YEAR)
     assert result == final
 
+    # same, from the scanner
+    ((number, match),) = ucd.find_notices(line, symbol, owner)
+    start, end, years = ucd.revise_notice(match, ucd.THIS_YEAR)
+    assert number == 0
+    assert (start, end) == (p3, p4)
+    assert f"{line[:start]}{years}{line[end:]}" == final
 
-def test_basic(tmpdir):
+
+def test_basic(tmpdir, monkeypatch):
     assert tmpdir.exists()
+    monkeypatch.setattr(ucd, "CACHE_FILE", tmpdir / "cache.sqlite")
 
     # make a text file with no copyright notice
     tfile = tmpdir / "example.txt"
@@ -184,6 +197,432 @@ def test_basic(tmpdir):
     assert line != notice  # updated
     assert line == revised  # updated
 
+
+def test_process_files_jobs(tmpdir, caplog):
+    notice = make_notice(f"{BASE_YEAR}-{ucd.LAST_YEAR}")
+    revised = make_notice(f"{BASE_YEAR}-{ucd.THIS_YEAR}")
+    files = []
+    for i in range(3 * ucd.CHUNK_SIZE):
+        path = tmpdir / f"file{i:03d}.txt"
+        path.write_text(f"line {i}\n{notice}\n" if i % 3 else f"line {i}\n")
+        files.append(path)
+    (tmpdir / "binary.dat").write_bytes(bytes(range(256)) * 4)
+    files.append(tmpdir / "binary.dat")
+
+    ucd.logger = None
+    with caplog.at_level("INFO", logger=ucd.__name__):
+        ucd.process_files(files, "Example", dry_run=True, jobs=4)
+    dry_run_messages = [r.getMessage() for r in caplog.records]
+    assert all(f.read_text().endswith(f"{notice}\n") for f in files[1:3])
+    caplog.clear()
+
+    # same messages, in the same order, as one at a time
+    with caplog.at_level("INFO", logger=ucd.__name__):
+        ucd.process_files(files, "Example", dry_run=True, jobs=1)
+    assert [r.getMessage() for r in caplog.records] == dry_run_messages
+    caplog.clear()
+
+    with caplog.at_level("INFO", logger=ucd.__name__):
+        ucd.process_files(files, "Example", jobs=4)
+    updated = [r.getMessage() for r in caplog.records if "Update" in r.getMessage()]
+    assert len(updated) == 2 * ucd.CHUNK_SIZE
+    assert updated == sorted(updated)  # in order of the file list
+    assert files[1].read_text() == f"line 1\n{revised}\n"
+    assert files[0].read_text() == "line 0\n"
+
+
+def test_find_source_files(tmpdir):
+    deep = tmpdir.joinpath(*["d"] * 200)  # walked without recursion
+    deep.mkdir(parents=True)
+    (deep / "deep.txt").write_text("deep\n")
+    (tmpdir / "top.txt").write_text("top\n")
+    cache = tmpdir / "d" / "__pycache__"
+    cache.mkdir()
+    (cache / "ignored.pyc").write_bytes(b"\0")
+
+    files = ucd.find_source_files(tmpdir)
+    assert not isinstance(files, list)  # a generator
+    assert sorted(files) == sorted([deep / "deep.txt", tmpdir / "top.txt"])
+    assert list(ucd.find_source_files(tmpdir / "top.txt")) == [tmpdir / "top.txt"]
+    assert list(ucd.find_source_files(cache)) == []
+
+
+def test_find_git_files(tmpdir):
+    make_git_repo(tmpdir, n_commits=1)
+    (tmpdir / ".gitignore").write_text("build/\n")
+    (tmpdir / "build").mkdir()
+    (tmpdir / "build" / "ignored.txt").write_text("ignored\n")
+    (tmpdir / "sub").mkdir()
+    (tmpdir / "sub" / "new file.txt").write_text("untracked\n")
+
+    files = sorted(ucd.find_git_files(tmpdir))
+    assert files == [
+        tmpdir / ".gitignore",
+        tmpdir / "file.txt",
+        tmpdir / "sub" / "new file.txt",
+    ]
+    assert list(ucd.find_git_files(tmpdir, untracked=False)) == [tmpdir / "file.txt"]
+    assert list(ucd.find_git_files(tmpdir / "sub")) == [tmpdir / "sub" / "new file.txt"]
+
+
+def test_find_changed_files(tmpdir):
+    make_git_repo(tmpdir, n_commits=3)  # 2024-01-01 .. 2024-01-03
+    (tmpdir / "new.txt").write_text("new\n")
+    everything = [tmpdir / "file.txt", tmpdir / "new.txt"]
+
+    assert list(ucd.find_changed_files(tmpdir, ref="HEAD")) == [tmpdir / "new.txt"]
+    assert list(ucd.find_changed_files(tmpdir, ref="v0")) == everything
+    assert list(ucd.find_changed_files(tmpdir, year="2025")) == [tmpdir / "new.txt"]
+    # no commit before 2024: every file is changed in 2024
+    assert list(ucd.find_changed_files(tmpdir, year="2024")) == everything
+    found = ucd.find_changed_files(tmpdir, ref="HEAD", untracked=False)
+    assert list(found) == []
+
+
+def test_is_recognized_text_file(tmpdir, monkeypatch):
+    monkeypatch.setattr(ucd, "_magic", None)
+    files = {
+        "module.py": (b"print('hello')\n", True),
+        "image.png": (b"\x89PNG\r\n\x1a\n not really", False),
+        "empty.txt": (b"", False),
+        "script": (b"#!/bin/sh\necho hello\n", True),
+    }
+    for name, (content, _expected) in files.items():
+        (tmpdir / name).write_bytes(content)
+    for name, (_content, expected) in files.items():
+        assert ucd.is_recognized_text_file(tmpdir / name) == expected, name
+    assert ucd._magic is None  # decided without libmagic
+
+    (tmpdir / "README").write_text("Some text.\n")
+    (tmpdir / "blob").write_bytes(bytes(range(1, 256)) * 8)
+    assert ucd.is_recognized_text_file(tmpdir / "README")
+    assert not ucd.is_recognized_text_file(tmpdir / "blob")
+    # With a NUL byte, libmagic decides, whatever the suffix.
+    (tmpdir / "data.txt").write_bytes(b"text\0with a NUL")
+    (tmpdir / "utf16.txt").write_text("Some text.\n", encoding="utf-16")
+    assert not ucd.is_recognized_text_file(tmpdir / "data.txt")
+    assert ucd.is_recognized_text_file(tmpdir / "utf16.txt")
+    # libmagic: image/svg+xml, not acceptable
+    (tmpdir / "drawing.svg").write_text('<svg xmlns="http://www.w3.org/2000/svg"/>\n')
+    assert not ucd.is_recognized_text_file(tmpdir / "drawing.svg")
+    assert ucd._magic is not None
+
+    # Decisions are remembered until the file changes.
+    hits = ucd._classify.cache_info().hits
+    assert ucd.is_recognized_text_file(tmpdir / "README")
+    assert ucd._classify.cache_info().hits == hits + 1
+    (tmpdir / "README").write_bytes(b"\0" * 10)
+    assert not ucd.is_recognized_text_file(tmpdir / "README")
+    assert not ucd.is_recognized_text_file(tmpdir / "no such file")
+
+
+def test_find_notices():
+    text = (
+        "header\n"
+        "(c) 2001 Example, (c) 2002 Example\n"  # only the first of a line
+        "Example (c) no year before the owner\n"
+        "(C) 1999 Example\n"
+        "(c) no year Example\n"
+    )
+    notices = list(ucd.find_notices(text, "(c)", "example"))
+    assert [number for number, _match in notices] == [1, 3, 4]
+    start, end, years = ucd.revise_notice(notices[1][1], "2000")
+    assert text[start:end] == "1999"
+    assert years == "1999-2000"
+    with pytest.raises(ucd.YearsNotFound):
+        ucd.revise_notice(notices[2][1], "2000")
+
+
+def test_update_in_place(tmpdir):
+    notice = make_notice(f"{BASE_YEAR}-{ucd.LAST_YEAR}")
+    revised = make_notice(f"{BASE_YEAR}-{ucd.THIS_YEAR}")
+
+    # line endings and bytes that are not UTF-8 are kept, as are permissions
+    script = tmpdir / "script.sh"
+    script.write_bytes(f"# caf\xe9\r\n# {notice}\r\n".encode("latin-1"))
+    script.chmod(0o755)
+    ucd.update(script, "Example")
+    assert script.read_bytes() == f"# caf\xe9\r\n# {revised}\r\n".encode("latin-1")
+    assert script.stat().st_mode & 0o777 == 0o755
+    assert sorted(tmpdir.iterdir()) == [script]  # no temporary file left
+
+    # no notice: file is not rewritten
+    other = tmpdir / "other.txt"
+    other.write_text("nothing here\n" * 1000)
+    mtime = other.stat().st_mtime_ns
+    ucd.update(other, "Example")
+    assert other.stat().st_mtime_ns == mtime
+    (tmpdir / "empty.txt").write_text("")
+    ucd.update(tmpdir / "empty.txt", "Example")
+
+    # non-ASCII owner
+    accents = tmpdir / "accents.txt"
+    accents.write_text(f"(C) {ucd.LAST_YEAR} Société\n", encoding="utf8")
+    ucd.update(accents, "SOCIÉTÉ")
+    text = accents.read_text(encoding="utf8")
+    assert text == f"(C) {ucd.LAST_YEAR}-{ucd.THIS_YEAR} Société\n"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_FileCache(tmpdir, caplog, jobs):
+    tree = tmpdir / "tree"
+    tree.mkdir()
+    notice = make_notice(f"{BASE_YEAR}-{ucd.LAST_YEAR}")
+    text = tree / "notice.txt"
+    text.write_text(f"{notice}\n")
+    (tree / "plain.txt").write_text("no notice\n")
+    (tree / "data.bin").write_bytes(b"\0\1\2")
+    cache = ucd.FileCache(tmpdir / "cache.sqlite")
+
+    def run(**kwargs):
+        caplog.clear()
+        with caplog.at_level("DEBUG", logger=ucd.__name__):
+            files = ucd.find_source_files(tree)
+            ucd.process_files(files, "Example", jobs=jobs, cache=cache, **kwargs)
+        return caplog.text
+
+    log = run(dry_run=True)
+    assert "Dry run" in log
+    assert cache.get(text).current is None  # not yet current
+    assert cache.get(tree / "data.bin").is_text is False
+
+    log = run()
+    assert f"Update with 1 line(s) changed: {text}" in log
+    record = cache.get(text)
+    assert record.current == ucd.settings_key(
+        "Example", ucd.COPYRIGHT_SYMBOL, ucd.THIS_YEAR
+    )
+    assert record.digest == ucd.file_digest(text)
+
+    # Nothing is examined again, not even after touching (not modifying) a file.
+    os.utime(text, ns=(0, 0))
+    log = run()
+    assert "Examining" not in log
+    assert log.count("Unchanged since last run") == 3 - 1  # data.bin is not text
+    assert cache.get(text).mtime_ns == 0
+
+    # A change of content, or of settings, is examined.
+    (tree / "plain.txt").write_text("no notice, still\n")
+    log = run(year=str(int(ucd.THIS_YEAR) + 1))
+    assert f"Examining: {text}" in log
+    assert f"Examining: {tree / 'plain.txt'}" in log
+    assert f"Examining: {tree / 'data.bin'}" not in log
+    cache.close()
+
+
+def test_WriteBatch(tmpdir, monkeypatch):
+    notice = make_notice(f"{BASE_YEAR}-{ucd.LAST_YEAR}")
+    revised = make_notice(f"{BASE_YEAR}-{ucd.THIS_YEAR}")
+    files = [tmpdir / f"file{i}.txt" for i in range(3)]
+    for fn in files:
+        fn.write_text(f"{notice}\n")
+
+    batch = ucd.WriteBatch(fsync=True)
+    for fn in files:
+        assert ucd.update(fn, "Example", batch=batch)
+    assert len(batch) == 3
+    assert all(fn.read_text() == f"{notice}\n" for fn in files)  # not yet
+
+    # The last replacement fails: the others are restored.
+    replace = os.replace
+    last = batch.staged[-1][1]
+
+    def failing_replace(source, destination):
+        if source == last:
+            raise OSError("disk full")
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        batch.commit()
+    assert all(fn.read_text() == f"{notice}\n" for fn in files)
+    assert sorted(tmpdir.iterdir()) == files  # no temporary or backup file
+    monkeypatch.undo()
+
+    for fn in files:
+        ucd.update(fn, "Example", batch=batch)
+    assert batch.commit() == 3
+    assert all(fn.read_text() == f"{revised}\n" for fn in files)
+    assert sorted(tmpdir.iterdir()) == files
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_update_links(tmpdir, batched):
+    notice = make_notice(f"{BASE_YEAR}-{ucd.LAST_YEAR}")
+    revised = make_notice(f"{BASE_YEAR}-{ucd.THIS_YEAR}")
+    (tmpdir / "real").mkdir()
+    target = tmpdir / "real" / "target.txt"
+    linked = tmpdir / "linked.txt"
+    for fn in (target, linked):
+        fn.write_text(f"{notice}\n")
+    symlink = tmpdir / "symlink.txt"
+    symlink.symlink_to(target)
+    hardlink = tmpdir / "hardlink.txt"
+    os.link(linked, hardlink)
+
+    batch = ucd.WriteBatch() if batched else None
+    for fn in (symlink, linked):
+        assert ucd.update(fn, "Example", batch=batch)
+    if batched:
+        assert batch.commit() == 2
+    assert symlink.is_symlink()
+    assert os.path.samefile(linked, hardlink)
+    for fn in (target, symlink, linked, hardlink):
+        assert fn.read_text() == f"{revised}\n", fn
+    # no temporary or backup file
+    assert sorted(p.name for p in tmpdir.iterdir()) == [
+        "hardlink.txt",
+        "linked.txt",
+        "real",
+        "symlink.txt",
+    ]
+    assert [p.name for p in (tmpdir / "real").iterdir()] == ["target.txt"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_process_files_interrupted(tmpdir, jobs):
+    notice = make_notice(f"{BASE_YEAR}-{ucd.LAST_YEAR}")
+    files = [tmpdir / f"file{i:03d}.txt" for i in range(200)]
+    for fn in files:
+        fn.write_text(f"{notice}\n")
+
+    def interrupted():
+        yield from files
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        ucd.process_files(interrupted(), "Example", jobs=jobs)
+    assert all(fn.read_text() == f"{notice}\n" for fn in files)
+    assert sorted(tmpdir.iterdir()) == files  # no temporary file
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_ChangePlan(tmpdir, jobs):
+    make_git_repo(tmpdir, n_commits=1)
+    notice = make_notice(f"{BASE_YEAR}-{ucd.LAST_YEAR}")
+    revised = make_notice(f"{BASE_YEAR}-{ucd.THIS_YEAR}")
+    body = "".join(f"line {i}\n" for i in range(10))
+    (tmpdir / "sub").mkdir()
+    (tmpdir / "sub" / "a.txt").write_text(f"# {notice}\n{body}# {notice}\n")
+    (tmpdir / "b.txt").write_text(f"{body}{notice}")  # no newline at the end
+    (tmpdir / "c.txt").write_text(f"{body}{revised}\n")  # current
+    files = sorted(ucd.find_git_files(tmpdir))
+
+    plans = {}
+    for fmt in ucd.PLAN_FORMATS:
+        plan = ucd.ChangePlan(io.StringIO(), fmt, root=tmpdir)
+        ucd.process_files(files, "Example", dry_run=True, jobs=jobs, plan=plan)
+        plans[fmt] = plan.stream.getvalue()
+
+    records = [json.loads(line) for line in plans["jsonl"].splitlines()]
+    old, new = f"{BASE_YEAR}-{ucd.LAST_YEAR}", f"{BASE_YEAR}-{ucd.THIS_YEAR}"
+    assert records == [
+        dict(file="b.txt", line=11, column=14, old=old, new=new),
+        dict(file="sub/a.txt", line=1, column=16, old=old, new=new),
+        dict(file="sub/a.txt", line=12, column=16, old=old, new=new),
+    ]
+
+    # The diff applies, with the same result as an update.
+    (tmpdir / "plan.diff").write_text(plans["diff"])
+    subprocess.run(["git", "apply", "plan.diff"], cwd=tmpdir, check=True)
+    assert (tmpdir / "b.txt").read_text() == f"{body}{revised}"
+    assert (tmpdir / "sub" / "a.txt").read_text() == f"# {revised}\n{body}# {revised}\n"
+
+
+def test_rules(tmpdir, monkeypatch):
+    rules_file = tmpdir / "rules.yml"
+    rules_file.write_text(
+        "rules:\n"
+        "  - owner: Second Owner\n"
+        "    symbol: Copyright\n"
+        "  - owner: Third Owner\n"
+        "    style: range\n"
+    )
+    rules = ucd.read_rules(rules_file)
+    assert rules == (
+        ucd.Rule("Second Owner", "Copyright"),
+        ucd.Rule("Third Owner", style="range"),
+    )
+    assert ucd.revise_years("2001, 2005", ["2001", "2005"], "2024", "range") == (
+        "2001-2024"
+    )
+    assert ucd.revise_years("2024", ["2024"], "2024", "range") == "2024"
+
+    source = tmpdir / "source.txt"
+    source.write_text(
+        f"(C) 2001 First Owner\n"
+        f"Copyright 2002, {ucd.LAST_YEAR} Second Owner\n"
+        f"(c) 1999, 2005 Third Owner\n"
+        f"(C) 2003 Unknown Owner\n"
+        f"(C) 2004 First Owner, Copyright 2005 Second Owner\n"
+    )
+    all_rules = (ucd.Rule("First Owner"), *rules)
+    found = list(ucd.find_rule_notices(source.read_text(), all_rules))
+    assert [(number, rule.owner) for number, _, rule in found] == [
+        (0, "First Owner"),
+        (1, "Second Owner"),
+        (2, "Third Owner"),
+        (4, "First Owner"),
+        (4, "Second Owner"),
+    ]
+    # Notices of two owners on one line: the first of each is found.
+    line = "(c) 2020 Alice, (c) 2021 Bob, (c) 2022 Alice\n"
+    for two in [
+        (ucd.Rule("Alice"), ucd.Rule("Bob")),
+        (ucd.Rule("Bob"), ucd.Rule("Alice")),
+    ]:
+        found = ucd.find_rule_notices(line, two)
+        assert [(match.group(0), rule.owner) for _, match, rule in found] == [
+            ("(c) 2020 Alice", "Alice"),
+            ("(c) 2021 Bob", "Bob"),
+        ]
+
+    monkeypatch.setattr(ucd, "CACHE_FILE", tmpdir / "cache.sqlite")
+    reset_argv()
+    sys.argv += ["--rules", str(rules_file), str(source), "First Owner"]
+    ucd.main()
+    assert source.read_text() == (
+        f"(C) 2001, {ucd.THIS_YEAR} First Owner\n"
+        f"Copyright 2002, {ucd.LAST_YEAR}-{ucd.THIS_YEAR} Second Owner\n"
+        f"(c) 1999-{ucd.THIS_YEAR} Third Owner\n"
+        f"(C) 2003 Unknown Owner\n"
+        f"(C) 2004, {ucd.THIS_YEAR} First Owner,"
+        f" Copyright 2005, {ucd.THIS_YEAR} Second Owner\n"
+    )
+
+    for text in [
+        "rules:\n  - owner: Example\n    style: sideways\n",
+        "rules:\n  - owner: 2024\n",  # not text
+        "rules: []\n",
+        "",
+    ]:
+        rules_file.write_text(text)
+        with pytest.raises(ValueError):
+            ucd.read_rules(rules_file)
+
+
+def test_benchmark(tmpdir):
+    from .bench_ucd import benchmark
+    from .bench_ucd import make_tree
+
+    counts = make_tree(tmpdir / "tree", 250)
+    assert sum(counts.values()) == 250
+    assert len(list(ucd.find_source_files(tmpdir / "tree"))) == 250
+
+    rows = benchmark(100, directory=tmpdir)
+    assert [row["phase"] for row in rows] == [
+        "walk",
+        "classify",
+        "update",
+        "end-to-end",
+        "end-to-end, new cache",
+        "end-to-end, cached",
+    ]
+    assert all(row["seconds"] > 0 and row["files_per_s"] > 0 for row in rows)
+    assert rows[1]["files"] == 100
+    assert 0 < rows[2]["files"] < 100  # text files only
+
+
 # zfile = tmpdir / "example.zip"
 # https://docs.python.org/3/library/zipfile.html#zipfile-objects
 # pcache = tmpfile / "__pycache__"
@@ -21,34 +21,69 @@ Public API
 
 .. autosummary::
 
+    ~ChangePlan
+    ~FileCache
+    ~find_changed_files
+    ~find_git_files
     ~find_source_files
+    ~process_files
+    ~read_rules
+    ~Rule
     ~update
 
 Internal Functions
 
 .. autosummary::
 
+    ~as_rules
+    ~file_digest
+    ~FileRecord
+    ~find_notices
+    ~find_rule_notices
     ~find_years_indices
+    ~is_ignored
     ~is_recognized_text_file
+    ~notice_pattern
     ~qualify_inputs
     ~revise_copyright_line
+    ~revise_notice
+    ~revise_years
+    ~rules_pattern
+    ~settings_key
     ~setup_logging
     ~sift_file_list
+    ~WriteBatch
     ~UnexpectedSeparatorError
     ~YearsNotFound
 
 """
 # See copyright text at bottom of this file for another example.
 
+import collections
+import concurrent.futures
 import datetime
+import functools
+import hashlib
+import itertools
+import json
+import locale
 import logging
+import mmap
+import os
 import pathlib
 import re
+import shutil
+import sqlite3
 import sys
+import tempfile
+import typing
 
 import magic
 
+from . import local_git
+
 COPYRIGHT_SYMBOL = "(C)"
+CHUNK_SIZE = 64  # files sent to a worker process at a time
 THIS_YEAR = str(datetime.datetime.now().year)
 LAST_YEAR = str(int(THIS_YEAR) - 1)
 
@@ -72,7 +107,42 @@ ACCEPTABLE_MIME_TYPES = """
     application/xslt+xml
 """.strip().split()
 
+# Decide by file name suffix, without asking libmagic.
+TEXT_SUFFIXES = """
+    .bat .c .cfg .cpp .css .csv .h .hpp .htm .html .ini .ipynb .java .js
+    .json .md .py .pyx .rst .sh .tex .toml .ts .txt .xml .yaml .yml
+""".strip().split()
+
+BINARY_SUFFIXES = """
+    .7z .a .bmp .bz2 .dll .dylib .exe .gif .gz .h5 .hdf .hdf5 .ico .jar
+    .jpeg .jpg .mp3 .mp4 .nc .npy .npz .o .pdf .pkl .png .pyc .pyd .so
+    .tar .tgz .tif .tiff .whl .xz .zip
+""".strip().split()
+
+SNIFF_SIZE = 8192  # bytes read to classify a file
+YEAR_PATTERN = re.compile(r"\d\d\d\d")
+YEAR_BYTES_PATTERN = re.compile(rb"[0-9]{4}")
+COPY_SIZE = 2**20  # bytes copied at a time, to a revised file
+
+WRITE_BATCH_SIZE = 256  # revised files replaced together
+
+PLAN_FORMATS = """
+    jsonl
+    diff
+""".strip().split()
+PLAN_CONTEXT = 3  # unchanged lines around each change, in a diff
+
+# How the years of a notice are revised, see Rule.
+STYLES = """
+    append
+    range
+""".strip().split()
+
+CACHE_DIR = pathlib.Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser()
+CACHE_FILE = CACHE_DIR / "murky" / "copyright_files.sqlite"
+
 logger = None  # created later, after verbosity is determined
+_magic = None  # one libmagic handle per process, created when first needed
 
 
 class UnexpectedSeparatorError(ValueError):
@@ -116,11 +186,35 @@ def revise_copyright_line(line, symbol, owner, year):
     year : *str*
         Line of text that contains a copyright notice.
     """
-    previous_year = str(int(year) - 1)
     years_list, start_index, end_index = find_years_indices(line, symbol, owner)
     # At this point, years is a non-empty list of 4-digit years (str).
-    years_str = line[start_index:end_index]
+    years_str = revise_years(line[start_index:end_index], years_list, year)
 
+    # Splice the years back into the line.
+    return f"{line[:start_index]}{years_str}{line[end_index:]}"
+
+
+def revise_years(years_str, years_list, year, style="append"):
+    """
+    Return the text of the years, revised to include year.
+
+    PARAMETERS
+
+    years_str : *str*
+        Text of the years, from the first year to the last.
+    years_list : *[str]*
+        The (4-digit) years in years_str.
+    year : *str*
+        The year to be included.
+    style : *str*
+        ``append``: append the year (or extend a range ending last year).
+        ``range``: one range, from the first year to the last.
+    """
+    if style == "range":
+        first, last = min(*years_list, year), max(*years_list, year)
+        return first if first == last else f"{first}-{last}"
+
+    previous_year = str(int(year) - 1)
     if year not in years_list:
         if len(years_list) == 1:
             # note: years_str == years_list[0] == years_list[-1]
@@ -144,9 +238,422 @@ def revise_copyright_line(line, symbol, owner, year):
                     raise UnexpectedSeparatorError(f"Unexpected {separator=!r}")
             else:
                 years_str = f"{years_str}, {year}"
+    return years_str
 
-    # Splice the years back into the line.
-    return f"{line[:start_index]}{years_str}{line[end_index:]}"
+
+class Rule(typing.NamedTuple):
+    """
+    One kind of copyright notice to update: ``SYMBOL YEARS OWNER``.
+
+    The years are revised in this 'style' (see :func:`revise_years`).
+    """
+
+    owner: str
+    symbol: str = COPYRIGHT_SYMBOL
+    style: str = "append"
+
+
+def as_rules(owner, symbol=COPYRIGHT_SYMBOL):
+    """Return a tuple of :class:`Rule`, from OWNER text or from rules."""
+    if isinstance(owner, str):
+        return (Rule(owner, symbol),)
+    return tuple(owner)
+
+
+def read_rules(path):
+    """
+    Return the tuple of :class:`Rule` listed in a YAML file.
+
+    Each rule has an ``owner`` and, optionally, a ``symbol`` (default:
+    ``COPYRIGHT_SYMBOL``) and a ``style`` (one of ``STYLES``, default:
+    ``append``).  Values are text (quote numbers).  Raise ``ValueError``
+    if a rule is not valid or if there are no rules.  Example::
+
+        rules:
+          - owner: Pete R. Jemian
+          - owner: UChicago Argonne, LLC
+            symbol: Copyright (c)
+          - owner: Example Project
+            style: range
+    """
+    import yaml
+
+    with open(path) as f:
+        content = yaml.safe_load(f) or {}
+    rules = []
+    for i, entry in enumerate(content.get("rules") or [], start=1):
+        entry = entry or {}
+        if not isinstance(entry, dict):
+            raise ValueError(f"{path}: rule {i}: {entry!r} is not a mapping")
+        for key, value in entry.items():
+            if not isinstance(value, str):
+                raise ValueError(
+                    f"{path}: rule {i}: {key}={value!r} is not text, quote it"
+                )
+        unknown = set(entry) - set(Rule._fields)
+        style = entry.get("style", "append")
+        if "owner" not in entry or unknown or style not in STYLES:
+            raise ValueError(
+                f"{path}: rule {i}: owner={entry.get('owner')!r}"
+                f" style={style!r} unknown={sorted(unknown)}"
+            )
+        rules.append(Rule(**entry))
+    if not rules:
+        raise ValueError(f"{path}: no rules")
+    return tuple(rules)
+
+
+@functools.lru_cache(maxsize=None)
+def notice_pattern(symbol, owner, binary=False):
+    """
+    Return the compiled pattern of a copyright notice: ``SYMBOL YEARS OWNER``.
+
+    The match is case-independent and within one line.  Group ``years`` is
+    the text between SYMBOL and the first OWNER after it.  A 'binary'
+    pattern searches bytes (case-independent for ASCII letters only).
+    """
+    pattern = f"{re.escape(symbol)}(?P<years>[^\\n]*?){re.escape(owner)}"
+    if binary:
+        pattern = pattern.encode("utf8")
+    return re.compile(pattern, re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=None)
+def rules_pattern(rules, binary=False):
+    """
+    Return one compiled pattern for the notices of all 'rules' (a tuple).
+
+    The pattern of each :class:`Rule` (as :func:`notice_pattern`) is an
+    alternative, with group ``years<i>`` for rule *i*.  A match's
+    ``lastgroup`` names the group of its rule.
+    """
+    pattern = "|".join(
+        f"{re.escape(rule.symbol)}(?P<years{i}>[^\\n]*?){re.escape(rule.owner)}"
+        for i, rule in enumerate(rules)
+    )
+    if binary:
+        pattern = pattern.encode("utf8")
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def find_notices(text, symbol, owner):
+    """
+    Yield (line number, match) of each copyright notice in the text.
+
+    One pass of :func:`notice_pattern` over the whole text, which may be
+    *str*, *bytes*, or a memory map.  Only the first notice of a line is
+    yielded.
+    """
+    binary = not isinstance(text, str)
+    yield from _first_of_line(text, notice_pattern(symbol, owner, binary))
+
+
+def find_rule_notices(text, rules):
+    """
+    Yield (line number, match, rule) of each notice of any of the 'rules'.
+
+    As :func:`find_notices`, one pass over the text (with
+    :func:`rules_pattern`) finds the lines with a notice.  On such a line,
+    the first notice of each rule is yielded, so one line may have notices
+    of several rules.  Notices do not overlap: of those found, the one
+    that ends first is kept, and the search for the others resumes after
+    it (so ``(c) 2020 Alice, (c) 2021 Bob`` has one notice of each).
+    """
+    binary = not isinstance(text, str)
+    lines = _first_of_line(text, rules_pattern(rules, binary))
+    if len(rules) == 1:
+        for number, match in lines:
+            yield number, match, rules[0]
+        return
+    newline = b"\n" if binary else "\n"
+    patterns = [notice_pattern(r.symbol, r.owner, binary) for r in rules]
+    for number, match in lines:
+        position, end = match.start(), text.find(newline, match.start())
+        end = len(text) if end < 0 else end
+        remaining = dict(enumerate(patterns))
+        while remaining:
+            found = [
+                (m.end(), i, m)
+                for i, pattern in remaining.items()
+                for m in [pattern.search(text, position, end)]
+                if m is not None
+            ]
+            if not found:
+                break
+            position, i, notice = min(found)
+            del remaining[i]
+            yield number, notice, rules[i]
+
+
+def _first_of_line(text, pattern):
+    """Yield (line number, match) of the first match of each line."""
+    newline = "\n" if isinstance(text, str) else b"\n"
+    number, position = 0, 0
+    previous = None
+    for match in pattern.finditer(text):
+        number += text[position : match.start()].count(newline)
+        position = match.start()
+        if number != previous:
+            previous = number
+            yield number, match
+
+
+def revise_notice(match, year, encoding="utf8", style="append"):
+    """
+    Return (start, end, years) to revise the notice found by :func:`find_notices`.
+
+    The text from 'start' to 'end' (of the whole text) is replaced by
+    'years', in this 'style'.  When the text is bytes, so are 'years', in
+    this 'encoding'.
+    """
+    binary = isinstance(match.re.pattern, bytes)
+    year_pattern = YEAR_BYTES_PATTERN if binary else YEAR_PATTERN
+    found = list(year_pattern.finditer(match.group(match.lastgroup)))
+    if len(found) == 0:
+        raise YearsNotFound(f"Copyright year(s) not found: {match.group()!r}")
+    offset = match.start(match.lastgroup)
+    start = offset + found[0].start()
+    end = offset + found[-1].end()
+    years_str = match.string[start:end]
+    years_list = [m.group() for m in found]
+    if binary:
+        years_str = years_str.decode(encoding, errors="surrogateescape")
+        years_list = [y.decode() for y in years_list]
+    years = revise_years(years_str, years_list, year, style)
+    if binary:
+        years = years.encode(encoding, errors="surrogateescape")
+    return start, end, years
+
+
+def _write_temporary(filename, content, changes):
+    """
+    Write the revised content of filename to a new temporary file.
+
+    The temporary file is in the same directory.  The unchanged parts of
+    'content' are copied in pieces of ``COPY_SIZE``.  Return its path.
+    """
+    binary = not isinstance(content, str)
+    fd, temporary = tempfile.mkstemp(
+        dir=filename.parent, prefix=f".{filename.name}.", suffix=".tmp"
+    )
+    try:
+        kwargs = dict(mode="wb") if binary else dict(mode="w", newline="")
+        with open(fd, **kwargs) as fp:
+            position = 0
+            for start, end, years in [*changes, (len(content), None, None)]:
+                for offset in range(position, start, COPY_SIZE):
+                    fp.write(content[offset : min(offset + COPY_SIZE, start)])
+                if years is not None:
+                    fp.write(years)
+                    position = end
+        shutil.copymode(filename, temporary)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return temporary
+
+
+def _replace(temporary, filename, in_place=False):
+    """
+    Replace filename with the temporary file, which is then gone.
+
+    With 'in_place', the content is copied into filename instead (not
+    atomically), so that other hard links to it see the revision too.
+    """
+    if not in_place:
+        os.replace(temporary, filename)
+        return
+    with open(temporary, "rb") as source, open(filename, "r+b") as target:
+        shutil.copyfileobj(source, target, COPY_SIZE)
+        target.truncate()
+    os.unlink(temporary)
+
+
+def _fsync(path, directory=False):
+    """Flush a file (or directory) to the storage device."""
+    flags = os.O_RDONLY | os.O_DIRECTORY if directory else os.O_RDWR
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteBatch:
+    """
+    Revised files (as temporary files), to replace their originals together.
+
+    :func:`update` stages the revision of a file in the batch.
+    :meth:`commit` replaces the originals, one ``os.replace()`` each (a
+    file with other hard links is rewritten in place).  If any
+    replacement fails, the files already replaced are restored (from hard
+    links, or copies, made just before) and the other revisions are
+    discarded: the batch is replaced entirely, or not at all.  With 'fsync', the
+    revisions are flushed to storage (all of them before the first
+    replacement) and so are their directories (once each, after).
+
+    PARAMETERS
+
+    fsync : *bool*
+        Flush the revisions and their directories to storage.
+    """
+
+    def __init__(self, fsync=False):
+        self.fsync = fsync
+        self.staged = []  # (filename, temporary)
+
+    def __len__(self):
+        return len(self.staged)
+
+    def stage(self, filename, temporary):
+        """Add the revision (temporary file) of filename to the batch."""
+        # A symbolic link is kept: its target is replaced.
+        self.staged.append((pathlib.Path(os.path.realpath(filename)), temporary))
+
+    def commit(self):
+        """Replace the staged files, all or none.  Return how many."""
+        staged, self.staged = self.staged, []
+        replaced = []  # (filename, backup, in_place)
+        try:
+            if self.fsync:
+                for _filename, temporary in staged:
+                    _fsync(temporary)
+            for filename, temporary in staged:
+                backup = filename.with_name(f".{filename.name}.{os.getpid()}.bak")
+                in_place = os.stat(filename).st_nlink > 1
+                if in_place:  # a hard link would be rewritten too
+                    shutil.copy2(filename, backup)
+                else:
+                    try:
+                        os.link(filename, backup)
+                    except OSError:  # no hard links here
+                        shutil.copy2(filename, backup)
+                try:
+                    _replace(temporary, filename, in_place)
+                except BaseException:
+                    if in_place:  # maybe rewritten in part
+                        _replace(backup, filename, in_place)
+                    else:
+                        os.unlink(backup)
+                    raise
+                replaced.append((filename, backup, in_place))
+        except BaseException:
+            for filename, backup, in_place in reversed(replaced):
+                _replace(backup, filename, in_place)
+            self.staged = staged
+            self.abort()
+            logger.error("Revisions of %d file(s) rolled back.", len(staged))
+            raise
+        for _filename, backup, _in_place in replaced:
+            os.unlink(backup)
+        if self.fsync and hasattr(os, "O_DIRECTORY"):  # not on Windows
+            for directory in {filename.parent for filename, _ in staged}:
+                _fsync(directory, directory=True)
+        return len(staged)
+
+    def abort(self):
+        """Discard the staged revisions."""
+        for _filename, temporary in self.staged:
+            try:
+                os.unlink(temporary)
+            except FileNotFoundError:
+                pass
+        self.staged = []
+
+
+class ChangePlan:
+    """
+    The changes of each file, as JSON Lines or as a unified diff.
+
+    :func:`update` adds the changes of a file (planned in a dry run).
+    :meth:`flush` writes what was added to 'stream'.  A ``jsonl`` plan has
+    one JSON object per changed notice: ``file``, ``line`` (from 1),
+    ``column`` (from 0), ``old`` and ``new`` text of the years.  A
+    ``diff`` plan is a unified diff (``git apply``, ``patch -p1``).  File
+    paths are relative to 'root'.
+
+    PARAMETERS
+
+    stream : *file*
+        Where the plan is written (None: kept, as in a worker process).
+    fmt : *str*
+        One of ``PLAN_FORMATS``.
+    root : *str* or *pathlib.Path*
+        Directory of the relative file paths.  Default: current directory.
+    """
+
+    def __init__(self, stream=None, fmt="jsonl", root=None):
+        self.stream = stream
+        self.fmt = fmt
+        self.root = root or os.curdir
+        self.pending = []  # text, not yet written
+
+    def flush(self):
+        """Write (and forget) the text added so far."""
+        if self.stream is not None:
+            self.stream.write("".join(self.pending))
+            self.pending = []
+
+    def add(self, filename, content, changes, encoding="utf8"):
+        """Add the changes, as (start, end, years), of the file's content."""
+        binary = not isinstance(content, str)
+        newline = b"\n" if binary else "\n"
+
+        def text(value):
+            return value.decode(encoding, "surrogateescape") if binary else value
+
+        path = pathlib.Path(os.path.relpath(filename, self.root)).as_posix()
+        edits = {}  # line number: (column, old years, new years, new line)
+        number, position = 0, 0
+        for start, end, years in changes:
+            number += content[position:start].count(newline)
+            position = start
+            line_start = content.rfind(newline, 0, start) + 1
+            line_end = content.find(newline, end) + 1 or len(content)
+            new_line = content[line_start:start] + years + content[end:line_end]
+            edits[number] = (
+                len(text(content[line_start:start])),
+                text(content[start:end]),
+                text(years),
+                text(new_line),
+            )
+
+        if self.fmt == "jsonl":
+            for number, (column, old, new, _) in edits.items():
+                record = dict(file=path, line=number + 1, column=column)
+                record.update(old=old, new=new)
+                self.pending.append(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+
+        lines = text(content[:]).split("\n")  # last: after the last newline
+        lines = [line + "\n" for line in lines[:-1]] + (
+            [lines[-1]] if lines[-1] else []
+        )
+        hunks = []  # [first, stop) line numbers
+        for number in edits:
+            first = max(0, number - PLAN_CONTEXT)
+            stop = min(len(lines), number + PLAN_CONTEXT + 1)
+            if hunks and first <= hunks[-1][1]:
+                hunks[-1][1] = stop
+            else:
+                hunks.append([first, stop])
+
+        def diff_line(prefix, line):
+            if not line.endswith("\n"):
+                line += "\n\\ No newline at end of file\n"
+            return prefix + line
+
+        diff = [f"--- a/{path}\n", f"+++ b/{path}\n"]
+        for first, stop in hunks:
+            size = stop - first
+            diff.append(f"@@ -{first + 1},{size} +{first + 1},{size} @@\n")
+            for number in range(first, stop):
+                if number in edits:
+                    diff.append(diff_line("-", lines[number]))
+                    diff.append(diff_line("+", edits[number][3]))
+                else:
+                    diff.append(diff_line(" ", lines[number]))
+        self.pending.append("".join(diff))
 
 
 def update(
@@ -155,84 +662,256 @@ def update(
     symbol=COPYRIGHT_SYMBOL,
     dry_run=False,
     year=THIS_YEAR,
+    batch=None,
+    plan=None,
 ):
-    """Update the copyright year in filename."""
+    """
+    Update the copyright year in filename.
+
+    'owner' is the OWNER text, or a sequence of :class:`Rule` (then
+    'symbol' is not used).  The notices of all rules are found in one pass.
+
+    The file is memory-mapped and searched as bytes (when SYMBOL and OWNER
+    are ASCII text), so a file without a notice is not even decoded.  Line
+    endings are kept.  The revised file is written to a temporary file
+    which then replaces the original (atomically), keeping its permissions.
+    A symbolic link is kept (its target is revised) and a file with other
+    hard links is rewritten in place, keeping the links.
+    With a 'batch' (a :class:`WriteBatch`), the revised file is staged,
+    to replace the original when the batch is committed.  With a 'plan'
+    (a :class:`ChangePlan`), the changes (also those of a dry run) are
+    added to the plan.
+
+    Return True if the file needs no (further) change for this owner,
+    symbol, and year: no notice, all notices current, or revised now.
+    """
     global logger
 
     logger = logger or logging.getLogger(__name__)
 
     if not filename.exists():
-        return
+        return False
 
     logger.debug("Examining: %s", filename)
-    # fmt: off
-    with open(filename) as fp:
-        text_file_lines = fp.readlines()
-    matching_line_numbers = [
-        number
-        for number, line in enumerate(text_file_lines)
-        if (
-            symbol.lower() in line.lower()
-            and owner.lower() in line.lower()
-        )
-    ]
-    # fmt: on
-    if len(matching_line_numbers) == 0:
-        logger.debug("No matching copyright notices: %s", filename)
-        return
+    rules = as_rules(owner, symbol)
+    encoding = locale.getpreferredencoding(False)  # as open() would use
+    with open(filename, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            logger.debug("No matching copyright notices: %s", filename)
+            return True
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            if not all(r.symbol.isascii() and r.owner.isascii() for r in rules):
+                content = content[:].decode(encoding)
+            args = (filename, content, rules, dry_run, year, encoding, plan)
+            changes, current = _find_changes(*args)
+            if len(changes) == 0:
+                return current
+            target = pathlib.Path(os.path.realpath(filename))
+            temporary = _write_temporary(target, content, changes)
+    # The original file is closed (and unmapped) now.
+    if batch is not None:
+        batch.stage(target, temporary)
+        return current
+    try:
+        _replace(temporary, target, os.stat(target).st_nlink > 1)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return current
+
+
+def _find_changes(filename, content, rules, dry_run, year, encoding, plan=None):
+    """
+    Return the changes to write to filename, as (start, end, years).
 
-    changes = {}  # key: line number, value: revised text for this line
-    for number in matching_line_numbers:
-        text = text_file_lines[number]
+    Also return whether the file will then be current (no notice in error).
+    """
+    binary = not isinstance(content, str)
+    newline = b"\n" if binary else "\n"
+    found = False
+    errors = 0
+    changes = []  # (start, end, revised years) in content
+    log_level = logging.INFO if dry_run else logging.DEBUG
+    for number, match, rule in find_rule_notices(content, rules):
+        found = True
         try:
-            revision = revise_copyright_line(text, symbol, owner, year)
+            start, end, years = revise_notice(match, year, encoding, rule.style)
         except (UnexpectedSeparatorError, YearsNotFound) as exinfo:
             logger.error("(%s,%d) %s", filename, number, exinfo)
+            errors += 1
             continue
-        if text != revision:
-            changes[number] = revision
-        if dry_run:
-            log_func = logger.info
-        else:
-            log_func = logger.debug
-        log_func("(%s,%d):\n---: %r\n+++: %r", filename, number, text, revision)
+        if content[start:end] != years:
+            changes.append((start, end, years))
+        if logger.isEnabledFor(log_level):
+            line_start = content.rfind(newline, 0, start) + 1
+            line_end = content.find(newline, end) + 1 or len(content)
+            line = content[line_start:line_end]
+            revision = content[line_start:start] + years + content[end:line_end]
+            if binary:
+                line = line.decode(encoding, errors="replace")
+                revision = revision.decode(encoding, errors="replace")
+            logger.log(
+                log_level,
+                "(%s,%d):\n---: %r\n+++: %r",
+                filename,
+                number,
+                line,
+                revision,
+            )
+
+    if not found:
+        logger.debug("No matching copyright notices: %s", filename)
+        return [], True
 
     if len(changes) == 0:
         logger.debug("No changes necessary: %s", filename)
-        return
+        return [], errors == 0
+
+    if plan is not None:
+        plan.add(filename, content, changes, encoding)
 
     if dry_run:
         logger.info("Dry run: original file not changed: %s", filename)
-        return
+        return [], False
 
     logger.info("Update with %d line(s) changed: %s", len(changes), filename)
-    for number, revision in changes.items():
-        text_file_lines[number] = revision
-    with open(filename, "w") as fp:
-        fp.writelines(text_file_lines)
+    return changes, errors == 0
+
+
+def is_ignored(path):
+    """Does this path end with one of the ``IGNORE_THESE_PATHS``?"""
+    path = str(path)
+    return any(path.endswith(ignore_dir) for ignore_dir in IGNORE_THESE_PATHS)
 
 
 def find_source_files(path):
-    """Return a list of all files in path and all of its subdirectories."""
-    files = []
+    """
+    Yield all files in path and all of its subdirectories.
+
+    Files are yielded as the walk finds them (depth first, in directory
+    order), so they may be processed before the walk is done.  Ignored
+    directories are not entered.  The type of each directory entry is
+    known from ``os.scandir()``, without another system call (on most
+    platforms).  The walk uses a stack, not recursion, so there is no
+    limit to the depth of the tree.
+    """
+    path = pathlib.Path(path)
+    if is_ignored(path):
+        return
+    if path.is_file():
+        yield path
+        return
+    if not path.is_dir():
+        return
 
-    for ignore_dir in IGNORE_THESE_PATHS:
-        if str(path).endswith(ignore_dir):
-            return []
+    stack = [os.scandir(path)]
+    try:
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:  # directory done
+                stack.pop().close()
+            elif is_ignored(entry.path):
+                continue
+            elif entry.is_file():
+                yield pathlib.Path(entry.path)
+            elif entry.is_dir():
+                try:
+                    stack.append(os.scandir(entry.path))
+                except OSError as exinfo:
+                    log = logger or logging.getLogger(__name__)
+                    log.warning("Cannot read directory: %s", exinfo)
+    finally:
+        for iterator in stack:
+            iterator.close()
+
+
+def find_git_files(path, untracked=True):
+    """
+    Yield the files in path (and its subdirectories) known to git.
 
+    Files are listed from the git index, so the working tree is not walked.
+    With 'untracked', files not yet added are also listed, except those
+    ignored (such as by ``.gitignore``).  Raise ``local_git.GitError`` if
+    path is not in a git repository.
+    """
+    path = pathlib.Path(path)
     if path.is_file():
-        files.append(path)
-    elif path.is_dir():
-        for item in path.iterdir():
-            files += find_source_files(item)
+        yield path
+        return
+    for name in local_git.iter_files(cwd=path, untracked=untracked):
+        yield path / name
 
-    return files
+
+def find_changed_files(path, ref=None, year=None, untracked=True):
+    """
+    Yield the files in path (and its subdirectories) changed since 'ref'.
+
+    Changes are committed since commit 'ref', or not yet committed.  When
+    'ref' is None, files changed in 'year' are yielded: those changed since
+    the last commit before January 1 of 'year' (all files known to git if
+    there is no such commit).  With 'untracked', new files are also
+    listed, except those ignored.  Raise ``local_git.GitError`` if path is
+    not in a git repository.
+    """
+    path = pathlib.Path(path)
+    if path.is_file():
+        yield path
+        return
+    if ref is None:
+        ref = local_git.commit_before(
+            f"{year or THIS_YEAR}-01-01 00:00:00 +0000", cwd=path
+        )
+        if ref is None:
+            yield from find_git_files(path, untracked=untracked)
+            return
+    for name in local_git.iter_changed_files(ref, cwd=path, untracked=untracked):
+        yield path / name
 
 
 def is_recognized_text_file(path):
-    """Is the file on this path acceptable as text?"""
-    mime = magic.Magic(mime=True).from_file(path)
-    # Note: identifies zero-length files as mime="inode/x-empty"
+    """
+    Is the file on this path acceptable as text?
+
+    Decisions are remembered, for as long as the file is not modified.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return _classify(str(path), st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=2**16)
+def _classify(path, mtime_ns, size):
+    """
+    Classify the file, cheapest tests first.
+
+    The first ``SNIFF_SIZE`` bytes are read once.  An empty file is not
+    text.  Then the name's suffix is looked up (``TEXT_SUFFIXES``,
+    ``BINARY_SUFFIXES``), then a ``#!`` line marks a script.  Only when
+    these do not decide is libmagic consulted, as it is for any file with
+    a NUL byte (binary data, or text such as UTF-16).
+    """
+    global _magic
+
+    try:
+        with open(path, "rb") as fp:
+            head = fp.read(SNIFF_SIZE)
+    except OSError:
+        return False
+    if len(head) == 0:
+        return False
+    if b"\0" not in head:
+        suffix = os.path.splitext(path)[-1].lower()
+        if suffix in TEXT_SUFFIXES:
+            return True
+        if suffix in BINARY_SUFFIXES:
+            return False
+        if head.startswith(b"#!"):
+            return True
+
+    _magic = _magic or magic.Magic(mime=True)
+    mime = _magic.from_buffer(head)
 
     # fmt: off
     return (
@@ -254,6 +933,293 @@ def sift_file_list(file_list):
     # fmt: on
 
 
+class FileRecord(typing.NamedTuple):
+    """What is known about one file, see :class:`FileCache`."""
+
+    path: str
+    mtime_ns: int
+    size: int
+    digest: str  # of the content
+    is_text: typing.Optional[bool] = None
+    current: typing.Optional[str] = None  # settings needing no change
+
+
+def settings_key(owner, symbol, year):
+    """Name the settings for which a file is known to need no change."""
+    rules = as_rules(owner, symbol)
+    return "\0".join((str(year), *itertools.chain.from_iterable(rules)))
+
+
+def file_digest(path):
+    """Return a digest (hex) of the file's content."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(COPY_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileCache:
+    """
+    What is known about each file from previous runs, in an SQLite database.
+
+    For each file path: its modification time, size, content digest,
+    whether it is text, and the settings (symbol, owner, year) for which
+    it needs no change.  An entry applies while the file's modification
+    time and size are unchanged or, when these changed, while its content
+    digest is unchanged (as after ``git checkout``).  A file current for
+    other settings is examined again.
+
+    PARAMETERS
+
+    path : *str* or *pathlib.Path*
+        SQLite database file.  Default: ``CACHE_FILE``
+    """
+
+    def __init__(self, path=None):
+        self.path = pathlib.Path(path or CACHE_FILE)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " mtime_ns INTEGER,"
+            " size INTEGER,"
+            " digest TEXT,"
+            " is_text INTEGER,"
+            " current TEXT)"
+        )
+        self.db.commit()
+
+    def get(self, path):
+        """Return the :class:`FileRecord` of path, or None if not cached."""
+        row = self.db.execute(
+            "SELECT * FROM files WHERE path=?", (str(path),)
+        ).fetchone()
+        if row is None:
+            return None
+        return FileRecord(*row[:4], bool(row[4]), row[5])
+
+    def put(self, records):
+        """Store (replace) these :class:`FileRecord` entries."""
+        self.db.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", records
+        )
+        self.db.commit()
+
+    def close(self):
+        """Close the database."""
+        self.db.close()
+
+
+def _check_file(filename, record, owner, symbol, dry_run, year, batch=None, plan=None):
+    """
+    Classify and update one file, return its new :class:`FileRecord`.
+
+    'record' is what the cache knew of the file (or None).  A file with
+    the same content, known to be current for these settings, is not
+    examined again.  A revision staged in 'batch' is recorded as the
+    file it will be.  Return None if the file cannot be read.
+    """
+    settings = settings_key(owner, symbol, year)
+    try:
+        st = os.stat(filename)
+        stat = dict(mtime_ns=st.st_mtime_ns, size=st.st_size)
+        if record is None or (record.mtime_ns, record.size) != tuple(stat.values()):
+            digest = file_digest(filename)
+            if record is not None and record.digest == digest:
+                record = record._replace(**stat)  # touched, not modified
+            else:
+                record = FileRecord(str(filename), digest=digest, **stat)
+    except OSError:
+        return None
+
+    if record.current == settings:
+        logger.debug("Unchanged since last run: %s", filename)
+        return record
+    if record.is_text is None:
+        record = record._replace(is_text=is_recognized_text_file(filename))
+    if not record.is_text:
+        return record
+
+    staged = 0 if batch is None else len(batch)
+    kwargs = dict(symbol=symbol, dry_run=dry_run, year=year, batch=batch, plan=plan)
+    current = update(filename, owner, **kwargs)
+    record = record._replace(current=settings if current else None)
+    if current and not dry_run:
+        revised = filename
+        if batch is not None and len(batch) > staged:
+            revised = batch.staged[-1][1]  # will be renamed to filename
+        st = os.stat(revised)
+        if (st.st_mtime_ns, st.st_size) != (record.mtime_ns, record.size):
+            record = record._replace(
+                mtime_ns=st.st_mtime_ns,
+                size=st.st_size,
+                digest=file_digest(revised),
+            )
+    return record
+
+
+def _process_one(filename, record, cached, owner, symbol, dry_run, year, batch, plan):
+    """Process one file, return its new :class:`FileRecord` if 'cached'."""
+    args = (owner, symbol, dry_run, year, batch, plan)
+    if cached:
+        return _check_file(filename, record, *args)
+    if is_recognized_text_file(filename):
+        update(filename, *args)
+    return None
+
+
+class _LogCollector(logging.Handler):
+    """Keep the log messages of a worker process, to be replayed in order."""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+def _start_worker(level):
+    """Initialize a worker process: collect (do not write) log messages."""
+    global logger
+
+    logger = logging.getLogger(__name__)
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.handlers = [_LogCollector()]
+
+
+def _process_chunk(chunk, owner, symbol, dry_run, year, cached=False, plan=None):
+    """
+    Update the text files of a chunk (in a worker process).
+
+    The chunk is a list of (filename, cached :class:`FileRecord` or None).
+    Return the log messages, as (level, message) tuples, (if 'cached')
+    the new records, the staged revisions (see :class:`WriteBatch`), and
+    the text of the 'plan' (see :class:`ChangePlan`).
+    """
+    collector = logger.handlers[0]
+    collector.messages = []
+    batch = WriteBatch()
+    args = (owner, symbol, dry_run, year, batch, plan)
+    records = [
+        _process_one(filename, record, cached, *args) for filename, record in chunk
+    ]
+    records = [r for r in records if r is not None]
+    return collector.messages, records, batch.staged, plan and plan.pending
+
+
+def process_files(
+    file_list,
+    owner,
+    symbol=COPYRIGHT_SYMBOL,
+    dry_run=False,
+    year=THIS_YEAR,
+    jobs=1,
+    cache=None,
+    fsync=False,
+    plan=None,
+):
+    """
+    Update the copyright year in each of the files recognized as text.
+
+    The 'file_list' may be any iterable, such as :func:`find_source_files`.
+    Files are processed as they arrive.  'owner' is the OWNER text or a
+    sequence of :class:`Rule`: each file is read once for all of them.
+
+    Revised files are staged (written to temporary files) and replace
+    their originals in batches of up to ``WRITE_BATCH_SIZE`` (see
+    :class:`WriteBatch`, with 'fsync').  If a batch fails, or the run is
+    interrupted, the files of that batch are restored and the revisions
+    not yet committed are discarded.
+
+    With ``jobs > 1``, files are classified and updated by a pool of
+    ``jobs`` processes, in chunks of ``CHUNK_SIZE`` files.  A few chunks
+    per process are in progress at a time.  The log messages of each file
+    are written in the order of 'file_list', as if the files were
+    processed one at a time.  Revised files are replaced by this process
+    only.
+
+    With a 'cache' (a :class:`FileCache`), files with the same content
+    as in a previous run are not classified again, and those already
+    current for this owner, symbol, and year are not searched again.
+    Records are cached once their batch is committed.
+
+    With a 'plan' (a :class:`ChangePlan`), the changes of each file (also
+    those of a dry run) are written to the plan, in the order of
+    'file_list'.
+    """
+    global logger
+
+    logger = logger or logging.getLogger(__name__)
+
+    batch = WriteBatch(fsync=fsync)
+    records = []
+    cached = cache is not None
+
+    def commit(at_least=0):
+        if max(len(batch), len(records)) >= at_least:
+            batch.commit()
+            if cached:
+                cache.put(records)
+            records.clear()
+
+    if jobs <= 1:
+        try:
+            for fn in file_list:
+                record = None if not cached else cache.get(fn)
+                args = (owner, symbol, dry_run, year, batch, plan)
+                record = _process_one(fn, record, cached, *args)
+                if record is not None:
+                    records.append(record)
+                if plan is not None:
+                    plan.flush()
+                commit(at_least=WRITE_BATCH_SIZE)
+            commit()
+        except BaseException:
+            batch.abort()
+            raise
+        return
+
+    def replay(future):
+        messages, new_records, staged, planned = future.result()
+        for level, message in messages:
+            logger.log(level, "%s", message)
+        if plan is not None:
+            plan.pending.extend(planned)
+            plan.flush()
+        records.extend(new_records)
+        batch.staged.extend(staged)
+        commit(at_least=WRITE_BATCH_SIZE)
+
+    files = ((fn, None if not cached else cache.get(fn)) for fn in file_list)
+    worker_plan = None if plan is None else ChangePlan(fmt=plan.fmt, root=plan.root)
+    args = (owner, symbol, dry_run, year, cached, worker_plan)
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_start_worker,
+        initargs=(logger.getEffectiveLevel(),),
+    ) as executor:
+        try:
+            for chunk in iter(lambda: list(itertools.islice(files, CHUNK_SIZE)), []):
+                pending.append(executor.submit(_process_chunk, chunk, *args))
+                if len(pending) > 2 * jobs:
+                    replay(pending.popleft())
+            while pending:
+                replay(pending.popleft())
+            commit()
+        except BaseException:
+            # Discard every revision not committed, also those in progress.
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    batch.staged.extend(future.result()[2])
+            batch.abort()
+            raise
+
+
 def qualify_inputs(root_path):
     """Raise error if this program cannot continue, based on the inputs."""
     if not root_path.exists():
@@ -284,7 +1250,13 @@ def command_args():
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
     parser.add_argument("root_dir", action="store", help="project root directory")
-    parser.add_argument("owner", action="store", help="Copyright owner text")
+    parser.add_argument(
+        "owner",
+        nargs="?",
+        default=None,
+        action="store",
+        help="Copyright owner text (optional with --rules)",
+    )
     parser.add_argument(
         "-s",
         "--symbol",
@@ -301,6 +1273,14 @@ def command_args():
         action="store",
         help=f"Final copyright year.  Default: {THIS_YEAR!r}",
     )
+    parser.add_argument(
+        "-r",
+        "--rules",
+        default=None,
+        action="store",
+        metavar="FILE",
+        help="YAML file of rules: owner, symbol, style of each notice to update.",
+    )
     parser.add_argument(
         "-d",
         "--dry-run",
@@ -308,6 +1288,67 @@ def command_args():
         action="store_true",
         help="Don't update any files.  Default: False",
     )
+    parser.add_argument(
+        "--plan",
+        default=None,
+        action="store",
+        metavar="FILE",
+        help="Write the changes to FILE ('-': stdout), also in a dry run.",
+    )
+    parser.add_argument(
+        "--plan-format",
+        default=None,
+        action="store",
+        choices=PLAN_FORMATS,
+        help="Plan format.  Default: diff for a .diff or .patch FILE, else jsonl",
+    )
+    parser.add_argument(
+        "-g",
+        "--git",
+        default=False,
+        action="store_true",
+        help=(
+            "Only files known to git (tracked, or new and not ignored)."
+            "  Default: all files"
+        ),
+    )
+    changes = parser.add_mutually_exclusive_group()
+    changes.add_argument(
+        "--since-ref",
+        default=None,
+        action="store",
+        metavar="REF",
+        help="Only files (known to git) changed since git commit REF.",
+    )
+    changes.add_argument(
+        "--changed-in-year",
+        default=False,
+        action="store_true",
+        help="Only files (known to git) changed in the final copyright year.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        action="store",
+        help="Number of processes, 0: one per CPU.  Default: 1",
+    )
+    parser.add_argument(
+        "--fsync",
+        default=False,
+        action="store_true",
+        help="Flush revised files to storage before replacing the originals.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        default=False,
+        action="store_true",
+        help=(
+            "Do not read or write the cache of files examined in previous runs."
+            f"  Default cache: {CACHE_FILE}"
+        ),
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -326,7 +1367,10 @@ def command_args():
         help="quiet output (show errors only), overrides -v option",
     )
     parser.add_argument("-V", "--version", action="version", version=__version__)
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.owner is None and args.rules is None:
+        parser.error("the owner (or --rules) is required")
+    return args
 
 
 def setup_logging(verbosity):
@@ -357,15 +1401,44 @@ def main():
     root_path = pathlib.Path(cli.root_dir).absolute()
     qualify_inputs(root_path)
 
-    file_list = sift_file_list(find_source_files(root_path))
-    for fn in file_list:
-        update(
-            fn,
-            cli.owner,
-            symbol=cli.symbol,
+    year = cli.year or THIS_YEAR
+    rules = read_rules(cli.rules) if cli.rules else ()
+    if cli.owner is not None:
+        rules = (Rule(cli.owner, cli.symbol), *rules)
+    if cli.since_ref or cli.changed_in_year:
+        file_list = find_changed_files(root_path, ref=cli.since_ref, year=year)
+    elif cli.git:
+        file_list = find_git_files(root_path)
+    else:
+        file_list = find_source_files(root_path)
+    cache = None if cli.no_cache else FileCache()
+    plan = None
+    if cli.plan is not None:
+        suffix = pathlib.Path(cli.plan).suffix.lower()
+        fmt = cli.plan_format or ("diff" if suffix in (".diff", ".patch") else "jsonl")
+        stream = sys.stdout
+        if cli.plan != "-":
+            stream = open(
+                cli.plan, "w", encoding="utf8", errors="surrogateescape", newline=""
+            )
+        root = root_path if root_path.is_dir() else root_path.parent
+        plan = ChangePlan(stream, fmt, root=root)
+    try:
+        process_files(
+            file_list,
+            rules,
             dry_run=cli.dry_run,
-            year=cli.year or THIS_YEAR,
+            year=year,
+            jobs=cli.jobs or os.cpu_count(),
+            cache=cache,
+            fsync=cli.fsync,
+            plan=plan,
         )
+    finally:
+        if cache is not None:
+            cache.close()
+        if plan is not None and plan.stream is not sys.stdout:
+            plan.stream.close()
 
 
 if __name__ == "__main__":